@@ -1,22 +1,66 @@
+import re
+import ast
+import json
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_openai import ChatOpenAI
 
+# Bloque ```json ... ``` o primer [..] / {..} dentro de un texto con más cosas alrededor
+_FENCED = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_BRACKETED = re.compile(r"(\[.*\]|\{.*\})", re.DOTALL)
+
 # Definir el esquema JSON esperado usando Pydantic
 class URLItem(BaseModel):
     title: str = Field(description="Title of the page")
     snippet: str = Field(description="Snippet of the page")
     link: str = Field(description="URL link of the page")
 
+
+def parse_json_locally(raw_content):
+    # JSON (o lista/dict de Python, como la imprime str()) sin llamar al LLM; None si no se puede
+    if isinstance(raw_content, (list, dict)):
+        return raw_content
+    text = str(raw_content).strip()
+    candidates = [text]
+    candidates += [match.strip() for match in _FENCED.findall(text)]
+    candidates += _BRACKETED.findall(text)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+        try:
+            value = ast.literal_eval(candidate)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if isinstance(value, (list, dict)):
+            return value
+    return None
+
+
 # Clase para validar y corregir JSON usando LangChain
 class JsonValidator:
     def __init__(self):
-        # Configuración del modelo y del parser
-        self.model = ChatOpenAI(temperature=0)
+        # El modelo solo se crea si algún contenido necesita de verdad la corrección
+        self._model = None
         self.parser = JsonOutputParser(pydantic_object=URLItem)
+        self.parsed_locally = 0
+        self.corrected_by_llm = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = ChatOpenAI(temperature=0)
+        return self._model
 
     def validate_and_correct(self, raw_content):
+        # Primero sin LLM: casi siempre el contenido ya es JSON válido
+        parsed = parse_json_locally(raw_content)
+        if parsed is not None:
+            self.parsed_locally += 1
+            return parsed
+
         # Crear un prompt con instrucciones para devolver un JSON bien formado
         prompt = PromptTemplate(
             template="Convert the following malformed JSON into a valid JSON format.\n{format_instructions}\n{json_content}\n",
@@ -29,6 +73,7 @@ class JsonValidator:
         try:
             # Intenta corregir el JSON malformado
             corrected_data = chain.invoke({"json_content": raw_content})
+            self.corrected_by_llm += 1
             return corrected_data
         except Exception as e:
             print(f"Error al validar o corregir el JSON: {e}")
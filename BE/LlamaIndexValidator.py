@@ -1,57 +1,57 @@
 import os
-import pickle  # Para guardar y cargar los embeddings
+import numpy as np
+from collections import defaultdict
 from dotenv import load_dotenv
-from llama_index.core import SimpleDirectoryReader, Settings, StorageContext, VectorStoreIndex, SimpleKeywordTableIndex
+from llama_index.core import Settings
 from llama_index.core import QueryBundle
 from llama_index.core.schema import NodeWithScore
-from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever, KeywordTableSimpleRetriever
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.indices.keyword_table.utils import simple_extract_keywords
 from llama_index.core import get_response_synthesizer
 from llama_index.core.query_engine import RetrieverQueryEngine
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from index_store import FolderIndexStore
+from query_cache import query_cache
+from local_embeddings import configure_embed_model
+from metrics import span
 
 # Cargar la clave de la API de OpenAI desde el archivo .env
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
+# Modelo de embeddings: OpenAI por defecto o uno local con EMBED_BACKEND=local
+configure_embed_model()
+
+# Estrategia de recuperación híbrida (ver CustomRetriever)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "FUSED")
+RETRIEVER_FUSION = os.getenv("RETRIEVER_FUSION", "rrf")
+RETRIEVER_TOP_K = int(os.getenv("RETRIEVER_TOP_K", "4"))
+RETRIEVER_CANDIDATES = int(os.getenv("RETRIEVER_CANDIDATES", "10"))
+
 class LlamaIndexAnalyzer:
     def __init__(self, folder_path: str):
         self.folder_path = folder_path
-        self.storage_context = StorageContext.from_defaults()
-        self.vector_index = None
-        self.keyword_index = None
+        self.index_store = FolderIndexStore(folder_path)  # Índice incremental en disco (.index/)
         self.custom_query_engine = None
-        self.embeddings_file = os.path.join(folder_path, "embeddings.pkl")  # Archivo para almacenar embeddings
 
     def load_and_index_files(self):
-        # Verificar si ya existen embeddings guardados
-        if os.path.exists(self.embeddings_file):
-            with open(self.embeddings_file, "rb") as f:
-                embeddings_data = pickle.load(f)
-            self.vector_index = embeddings_data["vector_index"]
-            self.keyword_index = embeddings_data["keyword_index"]
-        else:
-            # Procesar los documentos y generar nuevos embeddings
-            documents = SimpleDirectoryReader(self.folder_path).load_data()
-            nodes = Settings.node_parser.get_nodes_from_documents(documents)
-            self.storage_context.docstore.add_documents(nodes)
-
-            # Crear los índices vectoriales y de palabras clave
-            self.vector_index = VectorStoreIndex(nodes, storage_context=self.storage_context)
-            self.keyword_index = SimpleKeywordTableIndex(nodes, storage_context=self.storage_context)
-            
-            # Guardar los embeddings generados para uso futuro
-            with open(self.embeddings_file, "wb") as f:
-                pickle.dump({
-                    "vector_index": self.vector_index,
-                    "keyword_index": self.keyword_index
-                }, f)
-
-        # Configurar los recuperadores y el sintetizador de respuestas
-        vector_retriever = VectorIndexRetriever(index=self.vector_index, similarity_top_k=2)
-        keyword_retriever = KeywordTableSimpleRetriever(index=self.keyword_index)
+        # Embebe solo los archivos nuevos o modificados; el resto se abre por mmap
+        self.index_store.update()
+
+        # Configurar los recuperadores y el sintetizador de respuestas.
+        # En modo FUSED cada recuperador aporta más candidatos y la fusión se queda con top_k
+        fused = RETRIEVER_MODE == "FUSED"
+        vector_retriever = StoreVectorRetriever(self.index_store,
+                                                similarity_top_k=RETRIEVER_CANDIDATES if fused else 2)
+        keyword_retriever = StoreKeywordRetriever(self.index_store,
+                                                  num_chunks_per_query=RETRIEVER_CANDIDATES if fused else 10)
         
         # Configurar el buscador personalizado de forma híbrida
-        self.custom_retriever = CustomRetriever(vector_retriever, keyword_retriever, mode="AND")
+        self.custom_retriever = CustomRetriever(
+            vector_retriever, keyword_retriever, mode=RETRIEVER_MODE,
+            top_k=RETRIEVER_TOP_K if fused else None, fusion=RETRIEVER_FUSION,
+        )
         response_synthesizer = get_response_synthesizer()
 
         # Configurar el motor de consulta
@@ -59,13 +59,30 @@ class LlamaIndexAnalyzer:
             retriever=self.custom_retriever,
             response_synthesizer=response_synthesizer,
         )
+        # Variante que entrega los tokens del LLM a medida que se generan
+        self.streaming_query_engine = RetrieverQueryEngine(
+            retriever=self.custom_retriever,
+            response_synthesizer=get_response_synthesizer(streaming=True),
+        )
 
     def query(self, query_text: str):
         if not self.custom_query_engine:
             raise ValueError("Indices no inicializados. Llama a load_and_index_files() primero.")
         
-        # Ejecuta la consulta y obtiene la respuesta y los nodos de origen
-        response = self.custom_query_engine.query(query_text)
+        # Un solo embedding de la pregunta: sirve para la caché y para la recuperación
+        with span("query_embed"):
+            query_embedding = Settings.embed_model.get_query_embedding(query_text)
+        version = self.index_store.version
+        cached = query_cache.lookup(self.folder_path, version, query_embedding)
+        if cached is not None:
+            print("Respuesta desde caché semántica:", query_text)
+            return cached
+
+        # Recuperación y síntesis por separado para medir cada una
+        query_bundle = QueryBundle(query_text, embedding=query_embedding)
+        nodes = self.custom_query_engine.retrieve(query_bundle)
+        with span("synthesis"):
+            response = self.custom_query_engine.synthesize(query_bundle, nodes)
         
         # Extraer respuesta y contexto adicional (texto de los nodos de origen)
         source_texts = [
@@ -77,31 +94,166 @@ class LlamaIndexAnalyzer:
         print("Contenido de respuesta:", response)
         print("Contexto adicional:", source_texts)
         
-        return {"response": str(response), "context": source_texts}
+        result = {"response": str(response), "context": source_texts}
+        query_cache.store(self.folder_path, version, query_embedding, result)
+        return result
+
+    def stream_query(self, query_text: str):
+        # Generador de eventos: primero el contexto (nodos de origen) y luego los tokens
+        if not self.custom_query_engine:
+            raise ValueError("Indices no inicializados. Llama a load_and_index_files() primero.")
+
+        with span("query_embed"):
+            query_embedding = Settings.embed_model.get_query_embedding(query_text)
+        version = self.index_store.version
+        cached = query_cache.lookup(self.folder_path, version, query_embedding)
+        if cached is not None:
+            yield {"event": "context", "context": cached["context"], "cached": True}
+            yield {"event": "token", "token": cached["response"]}
+            return
+
+        query_bundle = QueryBundle(query_text, embedding=query_embedding)
+        nodes = self.streaming_query_engine.retrieve(query_bundle)
+        response = self.streaming_query_engine.synthesize(query_bundle, nodes)
+        source_texts = [node.node.text for node in response.source_nodes]
+        yield {"event": "context", "context": source_texts, "cached": False}
+
+        tokens = []
+        # Incluye el tiempo que el cliente tarda en leer cada token
+        with span("synthesis", streaming="true"):
+            for token in response.response_gen:
+                tokens.append(token)
+                yield {"event": "token", "token": token}
+
+        query_cache.store(self.folder_path, version, query_embedding,
+                          {"response": "".join(tokens), "context": source_texts})
+
+# Pool compartido para lanzar el recuperador vectorial y el de palabras clave a la vez
+_retriever_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVER_THREADS", "8")),
+                                     thread_name_prefix="retriever")
+
+
+def _best_by_id(nodes):
+    # Deduplica por id de nodo conservando la mejor puntuación, ordenado de mayor a menor
+    best = {}
+    for n in nodes:
+        current = best.get(n.node.node_id)
+        if current is None or (n.score or 0.0) > (current.score or 0.0):
+            best[n.node.node_id] = n
+    return sorted(best.values(), key=lambda n: n.score or 0.0, reverse=True)
+
 
 # Clase CustomRetriever para la búsqueda híbrida
 class CustomRetriever(BaseRetriever):
-    def __init__(self, vector_retriever, keyword_retriever, mode="AND"):
+    """Combina el recuperador vectorial y el de palabras clave.
+
+    - ``AND`` / ``OR``: intersección o unión de ambos resultados, ordenados por puntuación.
+    - ``FUSED``: fusión de rankings, por *reciprocal rank fusion* (``fusion="rrf"``)
+      o por suma ponderada de puntuaciones normalizadas (``fusion="weighted"``).
+    """
+
+    def __init__(self, vector_retriever, keyword_retriever, mode="AND", top_k=None,
+                 fusion="rrf", weights=(0.5, 0.5), rrf_k=60):
         self._vector_retriever = vector_retriever
         self._keyword_retriever = keyword_retriever
-        if mode not in ("AND", "OR"):
-            raise ValueError("Modo inválido. Usa 'AND' o 'OR'")
+        if mode not in ("AND", "OR", "FUSED"):
+            raise ValueError("Modo inválido. Usa 'AND', 'OR' o 'FUSED'")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError("Fusión inválida. Usa 'rrf' o 'weighted'")
         self._mode = mode
+        self._top_k = top_k
+        self._fusion = fusion
+        self._weights = weights
+        self._rrf_k = rrf_k
         super().__init__()
 
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-        vector_nodes = self._vector_retriever.retrieve(query_bundle)
-        keyword_nodes = self._keyword_retriever.retrieve(query_bundle)
-
-        vector_ids = {n.node.node_id for n in vector_nodes}
-        keyword_ids = {n.node.node_id for n in keyword_nodes}
+        with span("retrieve", retriever="hybrid"):
+            return self._retrieve_hybrid(query_bundle)
 
-        combined_dict = {n.node.node_id: n for n in vector_nodes}
-        combined_dict.update({n.node.node_id: n for n in keyword_nodes})
+    def _retrieve_hybrid(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Ambos recuperadores en paralelo: la latencia es la del más lento, no la suma
+        vector_future = _retriever_pool.submit(self._vector_retriever.retrieve, query_bundle)
+        keyword_nodes = _best_by_id(self._keyword_retriever.retrieve(query_bundle))
+        vector_nodes = _best_by_id(vector_future.result())
 
-        if self._mode == "AND":
-            retrieve_ids = vector_ids.intersection(keyword_ids)
+        if self._mode == "FUSED":
+            nodes = self._fuse(vector_nodes, keyword_nodes)
         else:
-            retrieve_ids = vector_ids.union(keyword_ids)
+            vector_ids = {n.node.node_id for n in vector_nodes}
+            keyword_ids = {n.node.node_id for n in keyword_nodes}
+
+            if self._mode == "AND":
+                retrieve_ids = vector_ids.intersection(keyword_ids)
+            else:
+                retrieve_ids = vector_ids.union(keyword_ids)
+
+            # Orden estable: primero por similitud vectorial, luego por coincidencias de palabras clave
+            nodes = [n for n in vector_nodes if n.node.node_id in retrieve_ids]
+            nodes += [n for n in keyword_nodes if n.node.node_id in retrieve_ids - vector_ids]
+
+        return nodes[:self._top_k] if self._top_k else nodes
+
+    def _fuse(self, vector_nodes, keyword_nodes):
+        fused = {}
+        by_id = {}
+        for weight, nodes in zip(self._weights, (vector_nodes, keyword_nodes)):
+            if self._fusion == "rrf":
+                contributions = [weight / (self._rrf_k + rank) for rank in range(1, len(nodes) + 1)]
+            else:
+                scores = np.array([n.score or 0.0 for n in nodes], dtype=np.float32)
+                spread = float(scores.max() - scores.min()) if len(scores) else 0.0
+                normalized = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+                contributions = (weight * normalized).tolist()
+            for n, contribution in zip(nodes, contributions):
+                fused[n.node.node_id] = fused.get(n.node.node_id, 0.0) + contribution
+                by_id.setdefault(n.node.node_id, n.node)
+
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        return [NodeWithScore(node=by_id[node_id], score=fused[node_id]) for node_id in ranked]
+
+
+# Recuperador vectorial sobre la matriz de embeddings del FolderIndexStore (exacto o IVF)
+class StoreVectorRetriever(BaseRetriever):
+    def __init__(self, index_store, similarity_top_k=2):
+        self._store = index_store
+        self._similarity_top_k = similarity_top_k
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if not self._store.num_nodes:
+            return []
+        if query_bundle.embedding is None:
+            query_bundle.embedding = Settings.embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        with span("retrieve", retriever="vector"):
+            rows, scores = self._store.search(query_bundle.embedding, self._similarity_top_k)
+            return [NodeWithScore(node=self._store.get_node(row), score=float(score))
+                    for row, score in zip(rows, scores)]
+
+
+# Recuperador por palabras clave, equivalente a KeywordTableSimpleRetriever
+class StoreKeywordRetriever(BaseRetriever):
+    def __init__(self, index_store, max_keywords_per_query=10, num_chunks_per_query=10):
+        self._store = index_store
+        self._max_keywords_per_query = max_keywords_per_query
+        self._num_chunks_per_query = num_chunks_per_query
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with span("retrieve", retriever="keyword"):
+            return self._retrieve_keywords(query_bundle)
+
+    def _retrieve_keywords(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        table = self._store.keywords
+        keywords = simple_extract_keywords(query_bundle.query_str, self._max_keywords_per_query)
 
-        return [combined_dict[rid] for rid in retrieve_ids]
+        # Ordenar los fragmentos por cantidad de palabras clave que coinciden
+        row_counts = defaultdict(int)
+        for keyword in keywords:
+            for row in table.get(keyword, ()):
+                row_counts[row] += 1
+        rows = sorted(row_counts, key=lambda row: row_counts[row], reverse=True)
+        rows = rows[:self._num_chunks_per_query]
+        return [NodeWithScore(node=self._store.get_node(row), score=float(row_counts[row])) for row in rows]
@@ -1,9 +1,13 @@
 import os
 import json
+import time
 import nest_asyncio
 import asyncio
-from langchain_community.document_loaders import AsyncChromiumLoader
-from langchain_community.document_transformers import BeautifulSoupTransformer
+from browser_pool import get_browser_pool
+from tiered_fetcher import TagTextExtractor, get_http_fetcher, tier_stats
+from page_cache import get_page_cache
+from text_chunker import TextChunker
+from metrics import span
 
 # Aplicar nest_asyncio para evitar problemas con el bucle de eventos
 nest_asyncio.apply()
@@ -19,6 +23,10 @@ class Scraper:
         subfolder_path = os.path.join(self.output_dir, subfolder_name)
         os.makedirs(subfolder_path, exist_ok=True)
 
+        # langchain solo se importa en los scrapers que lo usan, no al importar la API
+        from langchain_community.document_loaders import AsyncChromiumLoader
+        from langchain_community.document_transformers import BeautifulSoupTransformer
+
         # Cargar contenido de las URLs usando AsyncChromiumLoader
         loader = AsyncChromiumLoader(self.urls)
         docs = loader.load()  # No usamos await aquí
@@ -44,22 +52,112 @@ class Scraper:
 
 
 class ScraperSimple:
+    # Modo incremental: el texto sale de la página por tandas, sin descargar el HTML entero,
+    # se descartan repetidos y relleno, y se devuelve ya troceado para el indexador
+    streaming = os.getenv("SCRAPER_STREAMING_EXTRACT", "1") == "1"
+
     def __init__(self, url):
         self.url = url
 
     async def scrape(self):
+        if self.streaming:
+            return await self._scrape_streaming()
+        from langchain_community.document_transformers import BeautifulSoupTransformer
+        from langchain_core.documents import Document
         try:
-            loader = AsyncChromiumLoader([self.url])
-            docs = await loader.aload()  # Cargar asincrónicamente el contenido de la URL
+            # Reutiliza el Chromium compartido en lugar de lanzar uno nuevo por URL
+            html = await get_browser_pool().fetch(self.url)
 
-            if not docs:
+            if not html:
                 return "No content found at the provided URL."
 
+            docs = [Document(page_content=html, metadata={"source": self.url})]
+
+            # El parseo es CPU puro: fuera del event loop para no frenar los demás scrapings
             bs_transformer = BeautifulSoupTransformer()
-            docs_transformed = bs_transformer.transform_documents(docs, tags_to_extract=["p", "h1", "h2"])
+            with span("extract", parser="beautifulsoup"):
+                docs_transformed = await asyncio.to_thread(
+                    bs_transformer.transform_documents, docs, tags_to_extract=["p", "h1", "h2"]
+                )
 
             page_content = docs_transformed[0].page_content if docs_transformed else "No content extracted."
             return page_content
 
         except Exception as e:
-            raise Exception(f"Scraping failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Scraping failed: {str(e)}")
+
+    async def _scrape_streaming(self):
+        chunker = TextChunker()
+        try:
+            await get_browser_pool().extract(self.url, chunker)
+        except Exception as e:
+            raise Exception(f"Scraping failed: {str(e)}")
+        if chunker.truncated:
+            print(f"Texto de {self.url} truncado en {chunker.max_total_chars} caracteres")
+        return chunker.text() or "No content extracted."
+
+
+class ScraperTiered:
+    # Intenta primero un GET HTTP simple y solo recurre a Chromium si sale poco texto.
+    # Antes de todo consulta la caché global de páginas (compartida entre carpetas)
+    min_text_chars = int(os.getenv("SCRAPER_MIN_TEXT_CHARS", "500"))
+
+    def __init__(self, url):
+        self.url = url
+        self.tier = None
+
+    async def scrape(self):
+        page_cache = get_page_cache()
+        with span("scrape_cache_lookup"):
+            cached = await asyncio.to_thread(page_cache.lookup, self.url)
+        if cached and cached["fresh"]:
+            page_cache.record("hit")
+            self.tier = "cache"
+            tier_stats.record("cache", 0.0)
+            return cached["content"]
+
+        start = time.perf_counter()
+        headers = None
+        try:
+            extractor = TagTextExtractor(sink=TextChunker())
+            # Descarga y extracción van juntas: el parser se alimenta a medida que llega el HTML
+            with span("scrape_http"):
+                response = await get_http_fetcher().extract(
+                    self.url, extractor,
+                    etag=cached and cached["etag"], last_modified=cached and cached["last_modified"],
+                )
+            headers = response.headers
+            if response.status_code == 304:
+                # La copia en caché sigue vigente: no hace falta volver a descargarla
+                await asyncio.to_thread(page_cache.touch, self.url, headers)
+                page_cache.record("revalidated")
+                self.tier = "revalidated"
+                tier_stats.record("revalidated", time.perf_counter() - start)
+                return cached["content"]
+            if extractor.text_length >= self.min_text_chars:
+                self.tier = "http"
+                tier_stats.record("http", time.perf_counter() - start)
+                page_cache.record("miss")
+                await asyncio.to_thread(page_cache.store, self.url, extractor.text(), headers, "http")
+                return extractor.text()
+        except Exception as e:
+            print(f"HTTP rápido falló para {self.url}: {e}. Usando Chromium.")
+        tier_stats.record_escalation(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        try:
+            # El texto se extrae dentro de Chromium por tandas: el HTML no llega a Python
+            chunker = TextChunker()
+            with span("scrape_browser"):
+                await get_browser_pool().extract(self.url, chunker)
+        except Exception as e:
+            raise Exception(f"Scraping failed: {str(e)}")
+        self.tier = "browser"
+        tier_stats.record("browser", time.perf_counter() - start)
+        page_cache.record("miss")
+        content = chunker.text()
+        if not content:
+            return "No content extracted."
+        # Los validadores del GET (si lo hubo) sirven para revalidar la próxima vez
+        await asyncio.to_thread(page_cache.store, self.url, content, headers, "browser")
+        return content
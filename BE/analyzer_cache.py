@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from segment_store import folder_signature
+from metrics import span
+
+
+class AnalyzerCache:
+    """LRU de analizadores listos para consultar, uno por carpeta.
+
+    Cada entrada guarda la huella de la carpeta y la versión del índice con la
+    que se construyó; si la carpeta cambia, la entrada se invalida y se
+    reconstruye (de forma incremental) en la siguiente consulta.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or int(os.getenv("ANALYZER_CACHE_MAX_ENTRIES", "32"))
+        self.max_bytes = max_bytes or int(os.getenv("ANALYZER_CACHE_MAX_MB", "512")) * 1024 * 1024
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, folder_path, allow_stale=False):
+        # allow_stale: si la carpeta se está llenando (pipeline en marcha) vale el último
+        # analizador construido; el pipeline lo irá actualizando conforme lleguen páginas
+        signature = folder_signature(folder_path)
+        with self._lock:
+            if allow_stale and folder_path in self._entries:
+                self._entries.move_to_end(folder_path)
+                self.hits += 1
+                return self._entries[folder_path]["analyzer"]
+            if self._lookup(folder_path, signature):
+                return self._entries[folder_path]["analyzer"]
+            build_lock = self._build_locks.setdefault(folder_path, threading.Lock())
+
+        # Un solo hilo construye cada carpeta; los demás esperan y reutilizan su resultado
+        with build_lock:
+            signature = folder_signature(folder_path)
+            with self._lock:
+                if folder_path in self._entries and self._entries[folder_path]["signature"] == signature:
+                    return self._entries[folder_path]["analyzer"]
+            with span("analyzer_build"):
+                # LlamaIndex se importa aquí, con el primer análisis, y no al arrancar la API
+                from LlamaIndexValidator import LlamaIndexAnalyzer
+                analyzer = LlamaIndexAnalyzer(folder_path)
+                analyzer.load_and_index_files()
+            with self._lock:
+                self._entries[folder_path] = {
+                    "signature": signature,
+                    "version": analyzer.index_store.version,
+                    "analyzer": analyzer,
+                    "size": analyzer.index_store.size_bytes,
+                }
+                self._evict()
+        return analyzer
+
+    def _lookup(self, folder_path, signature):
+        entry = self._entries.get(folder_path)
+        if entry is not None and entry["signature"] == signature:
+            self._entries.move_to_end(folder_path)
+            self.hits += 1
+            return True
+        if entry is not None:
+            # La carpeta cambió desde que se cargó el índice
+            del self._entries[folder_path]
+            self.invalidations += 1
+        self.misses += 1
+        return False
+
+    def _evict(self):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, folder_path):
+        with self._lock:
+            if self._entries.pop(folder_path, None) is not None:
+                self.invalidations += 1
+
+    @property
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "folders": {folder: entry["version"] for folder, entry in self._entries.items()},
+            }
+
+
+analyzer_cache = AnalyzerCache()
@@ -0,0 +1,99 @@
+import os
+import numpy as np
+
+
+class IVFIndex:
+    """Índice aproximado (IVF) sobre vectores normalizados, solo con NumPy.
+
+    Agrupa los vectores con k-means esférico en ``nlist`` listas; una consulta
+    solo compara contra las filas de las ``nprobe`` listas más cercanas. Los
+    arrays se guardan como .npy y se abren con mmap igual que los vectores.
+    ``fit`` es la similitud media de los vectores con su centroide al entrenar:
+    si las filas que se añaden después quedan bastante peor, toca reentrenar.
+    """
+
+    def __init__(self, centroids, rows, offsets, fit=None):
+        self.centroids = centroids
+        self.rows = rows
+        self.offsets = offsets
+        self.fit = fit
+
+    @classmethod
+    def build(cls, vectors, nlist=None, iterations=10, sample_size=50000, seed=0):
+        n = len(vectors)
+        nlist = nlist or int(min(1024, max(16, np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(n, sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(len(centroids)):
+                members = sample[assignment == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assignment, similarity = cls._assign(vectors, centroids)
+        return cls._from_assignment(centroids.astype(np.float32), assignment, float(similarity.mean()))
+
+    @classmethod
+    def _from_assignment(cls, centroids, assignment, fit):
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids, order.astype(np.int64), offsets, fit)
+
+    @staticmethod
+    def _assign(vectors, centroids, batch=65536):
+        # Centroide más cercano y su similitud; por lotes para no materializar una matriz n x nlist
+        if not len(vectors):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        assignment, similarity = [], []
+        for start in range(0, len(vectors), batch):
+            scores = vectors[start:start + batch] @ centroids.T
+            best = np.argmax(scores, axis=1)
+            assignment.append(best)
+            similarity.append(scores[np.arange(len(best)), best])
+        return np.concatenate(assignment), np.concatenate(similarity)
+
+    def extend(self, remap, vectors, first_row):
+        """Mismo índice para una versión nueva, sin volver a entrenar.
+
+        Las filas que siguen conservan su lista (renumeradas con ``remap``: fila
+        vieja -> fila nueva, -1 si se descarta) y las nuevas, desde ``first_row``,
+        van al centroide más cercano. Devuelve (índice, similitud media de las
+        filas nuevas o None).
+        """
+        old_assignment = np.repeat(np.arange(len(self.centroids)), np.diff(self.offsets))
+        mapped = remap[self.rows]
+        keep = mapped >= 0
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        assignment[mapped[keep]] = old_assignment[keep]
+        added, similarity = self._assign(vectors[first_row:], self.centroids)
+        assignment[first_row:] = added
+        extended = self._from_assignment(np.asarray(self.centroids), assignment, self.fit)
+        return extended, float(similarity.mean()) if len(similarity) else None
+
+    def search(self, vectors, query, top_k, nprobe=8):
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        if not len(candidates):
+            return candidates, np.zeros(0, dtype=np.float32)
+        candidates = np.sort(candidates)  # acceso secuencial al mmap
+        scores = vectors[candidates] @ query
+        top_k = min(top_k, len(candidates))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return candidates[best], scores[best]
+
+    def save(self, path):
+        np.save(os.path.join(path, "ivf_centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "ivf_rows.npy"), self.rows)
+        np.save(os.path.join(path, "ivf_offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        return cls(*(np.load(os.path.join(path, f"ivf_{name}.npy"), mmap_mode="r")
+                     for name in ("centroids", "rows", "offsets")))
@@ -1,19 +1,34 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from search_class import TaskExecutorSimple
-from Scraper import ScraperSimple  # Clase para scraping simple
+from search_cache import search_cache
+from Scraper import ScraperTiered  # HTTP rápido con Chromium como respaldo
+from scraping_engine import get_scraping_engine
+from browser_pool import get_browser_pool
+from tiered_fetcher import get_http_fetcher, tier_stats
+from page_cache import get_page_cache
 import traceback
 import os
 import hashlib
-from typing import List
+from typing import List, Optional
 import uuid
 import json
 import asyncio
-from LlamaIndexValidator import LlamaIndexAnalyzer
+from analyzer_cache import analyzer_cache
+from query_cache import query_cache
+from job_queue import get_job_queue
+from near_dedup import FolderDeduplicator
+from pipeline import SearchScrapeIndexPipeline, active_folders
+from metrics import instrument_app
+from segment_store import get_folder_store, folder_in_use, StoreCollector
+from warmup import components
 
 app = FastAPI()
 
+# Latencia por ruta y por etapa en /metrics (y perfilado opcional con PROFILE_REQUESTS)
+instrument_app(app, "api")
+
 # Configuración de CORS
 app.add_middleware(
     CORSMiddleware,
@@ -23,17 +38,99 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los encabezados
 )
 
+
+# Subsistemas pesados: se importan/arrancan al primer uso del endpoint que los necesita
+def load_search():
+    # crewai y langchain (búsqueda en DuckDuckGo)
+    from search_class import get_simple_executor
+    return get_simple_executor()
+
+
+async def load_browser():
+    await get_browser_pool().start()
+    return get_browser_pool()
+
+
+def load_llama_index():
+    # LlamaIndex y el modelo de embeddings; analyzer_cache lo importa al construir el primer analizador
+    import LlamaIndexValidator
+    return LlamaIndexValidator
+
+
+# Carpetas a precargar: WARMUP_FOLDERS=uuid1,uuid2 o las WARMUP_HOT_FOLDERS usadas más recientemente
+WARMUP_FOLDERS = [name.strip() for name in os.getenv("WARMUP_FOLDERS", "").split(",") if name.strip()]
+WARMUP_HOT_FOLDERS = int(os.getenv("WARMUP_HOT_FOLDERS", "4"))
+
+
+def load_hot_indexes():
+    if WARMUP_FOLDERS:
+        folders = [os.path.join("data", name) for name in WARMUP_FOLDERS]
+    else:
+        candidates = [os.path.join("data", name) for name in os.listdir("data")] if os.path.isdir("data") else []
+        candidates = [folder for folder in candidates if os.path.isdir(folder)]
+        candidates.sort(key=lambda folder: get_folder_store(folder).last_access(), reverse=True)
+        folders = candidates[:WARMUP_HOT_FOLDERS]
+    loaded = []
+    for folder_path in folders:
+        if os.path.isdir(folder_path):
+            analyzer_cache.get(folder_path)
+            loaded.append(folder_path)
+    return loaded
+
+
+components.register("search", load_search)
+components.register("browser", load_browser)
+components.register("llama_index", load_llama_index)
+components.register("indexes", load_hot_indexes)
+# /ready y precarga opcional en segundo plano (WARMUP=search,browser,llama_index,indexes o all)
+components.install(app)
+
+
+def evict_folder(folder_path):
+    # El recolector borró la carpeta: fuera también su analizador y sus consultas cacheadas
+    analyzer_cache.invalidate(folder_path)
+    query_cache.invalidate(folder_path)
+
+
+# Borra en segundo plano las carpetas sin uso (STORE_TTL_DAYS) o que exceden STORE_DISK_BUDGET_MB.
+# Las carpetas dentro de folder_in_use (scraping, trabajos, pipelines, análisis) se respetan
+store_collector = StoreCollector("data", on_evict=evict_folder)
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    # Arranca los workers y retoma los trabajos que quedaron a medias en el último apagado
+    await get_job_queue().start()
+    store_collector.start()
+
+
+@app.on_event("shutdown")
+async def close_browser_pool():
+    # Cerrar el Chromium compartido y el cliente HTTP al apagar el servidor
+    store_collector.stop()
+    await get_job_queue().stop()
+    await get_browser_pool().close()
+    await get_http_fetcher().close()
+
+
+def ndjson(event):
+    # Una línea JSON por evento en las respuestas en streaming
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
 # ________________________________________________________________________
 # Modelo de datos para la solicitud de búsqueda simple
 class SearchRequest(BaseModel):
     subject: str
+    max_results: Optional[int] = None  # Resultados por página (SEARCH_MAX_RESULTS por defecto)
+    page: int = 0  # Página de resultados, desde 0
 
 @app.post("/run_simple_search/")
 async def run_simple_search(request: SearchRequest):
-    executor = TaskExecutorSimple()
+    executor = await components.get("search")
     try:
         # Ejecuta la búsqueda simple
-        result_content = executor.run_simple_search(request.subject)
+        result_content = await executor.run_simple_search_async(request.subject, request.max_results, request.page)
         print("result_content", result_content)
         return {
             "message": "Simple search completed",
@@ -48,10 +145,10 @@ async def run_simple_search(request: SearchRequest):
 # Endpoint para la búsqueda simple en DuckDuckGo
 @app.post("/run_simple_search_duck/")
 async def run_simple_search_duck(request: SearchRequest):
-    executor = TaskExecutorSimple()
+    executor = await components.get("search")
     try:
         # Ejecuta la búsqueda simple
-        result_content = executor.run_simple_search(request.subject)
+        result_content = await executor.run_simple_search_async(request.subject, request.max_results, request.page)
         return {
             "message": "Simple search completed",
             "result_content": result_content
@@ -61,36 +158,104 @@ async def run_simple_search_duck(request: SearchRequest):
         raise HTTPException(status_code=500, detail=f"Search failed: {error_details}")
 
 
+# Varios destinos en una sola petición: las búsquedas van en paralelo y cada una usa la caché
+class BatchSearchRequest(BaseModel):
+    subjects: List[str]
+    max_results: Optional[int] = None
+
+@app.post("/run_batch_search/")
+async def run_batch_search(request: BatchSearchRequest):
+    executor = await components.get("search")
+    try:
+        results = await executor.run_batch_search_async(request.subjects, request.max_results)
+        return {"message": "Batch search completed", "results": results}
+    except Exception as e:
+        error_details = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Search failed: {error_details}")
+
+
+# Aciertos, coalescencias y refrescos en segundo plano de la caché de búsquedas
+@app.get("/search_cache_stats/")
+async def search_cache_stats():
+    return search_cache.stats()
+
+
 # ________________________________________________________________________
 
 
 # ________________________________________________________________________
-# Función para ejecutar el scraping y almacenar resultados (sin cambios)
-async def save_scraping_results(urls, folderUUID, scraper_class):
+# Función para ejecutar el scraping y almacenar resultados
+async def iter_scraping_results(urls, folderUUID, scraper_class):
+    # Generador asíncrono: entrega el resultado de cada URL en cuanto termina
     folder_path = os.path.join("data", folderUUID)
     os.makedirs(folder_path, exist_ok=True)
-    
-    saved_results = []
+    with folder_in_use(folder_path):
+        store = await asyncio.to_thread(get_folder_store, folder_path)
+
+        pending = {}
+        for url in dict.fromkeys(urls):
+            url_hash = hashlib.md5(url.encode()).hexdigest()
+            file_path = os.path.join(folder_path, f"{url_hash}.txt")
+
+            if store.exists(os.path.basename(file_path)):
+                print(f"El contenido de {url} ya existe. Saltando scraping.")
+                yield {"url": url, "file": file_path, "status": "Already exists"}
+                continue
+            pending[url] = file_path
+
+        # Quita los párrafos casi repetidos de lo que ya hay en la carpeta antes de escribir
+        deduplicator = FolderDeduplicator(folder_path) if pending else None
+
+        # Scraping concurrente con el pool de navegadores compartido
+        async for result in get_scraping_engine().scrape(list(pending), scraper_class):
+            yield await store_scraping_result(result, pending[result["url"]], deduplicator)
+
+
+async def store_scraping_result(result, file_path, deduplicator):
+    # Escribe el resultado de una URL en la carpeta y devuelve su evento
+    url = result["url"]
+    content = result["content"]
+
+    if result["error"]:
+        return {"url": url, "file": None, "status": "Error", "error": result["error"]}
+    if not content:
+        return {"url": url, "file": None, "status": "No content"}
+    written, dedup = await asyncio.to_thread(
+        deduplicator.write, os.path.basename(file_path), content, f"URL: {url}\n\n"
+    )
+    if not written:
+        return {"url": url, "file": None, "status": "Duplicate", "dedup": dedup}
+    # Si vino de la caché global no se volvió a descargar, solo se copia a la carpeta
+    return {"url": url, "file": file_path, "status": "Saved", "tier": result["tier"], "dedup": dedup}
 
-    for index, url in enumerate(urls, start=1):
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        file_path = os.path.join(folder_path, f"{url_hash}.txt")
 
-        if os.path.exists(file_path):
-            print(f"El contenido de {url} ya existe. Saltando scraping.")
-            saved_results.append({"url": url, "file": file_path, "status": "Already exists"})
-            continue
+async def save_scraping_results(urls, folderUUID, scraper_class):
+    return [result async for result in iter_scraping_results(urls, folderUUID, scraper_class)]
 
-        scraper = scraper_class(url)
-        content = await scraper.scrape()
-        
-        if content:
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(f"URL: {url}\n\n{content}")
-            saved_results.append({"url": url, "file": file_path, "status": "Saved"})
-        else:
-            saved_results.append({"url": url, "file": None, "status": "No content"})
-    return saved_results
+
+# Qué nivel (caché, HTTP o Chromium) sirvió cada URL y cuánto tiempo de navegador se ahorra
+@app.get("/scraping_stats/")
+async def scraping_stats():
+    return {**tier_stats.snapshot(), "page_cache": await asyncio.to_thread(get_page_cache().stats)}
+
+
+# Párrafos repetidos descartados en una carpeta y bytes/tokens ahorrados
+@app.get("/dedup_stats/{folderUUID}")
+async def dedup_stats(folderUUID: str):
+    folder_path = os.path.join("data", folderUUID)
+    if not os.path.exists(folder_path):
+        raise HTTPException(status_code=404, detail="Carpeta no encontrada")
+    return await asyncio.to_thread(lambda: FolderDeduplicator(folder_path).stats())
+
+
+# Segmento comprimido de una carpeta (documentos, bytes originales y en disco) y estado del recolector
+@app.get("/store_stats/{folderUUID}")
+async def store_stats(folderUUID: str):
+    folder_path = os.path.join("data", folderUUID)
+    if not os.path.exists(folder_path):
+        raise HTTPException(status_code=404, detail="Carpeta no encontrada")
+    return {**await asyncio.to_thread(lambda: get_folder_store(folder_path).stats()),
+            "collector": store_collector.stats()}
 
 
 # Modelo de datos para la solicitud de scraping simple (una sola URL)
@@ -102,7 +267,7 @@ class SimpleScrapingRequest(BaseModel):
 async def simple_scraping(request: SimpleScrapingRequest):
     try:
         # Usa la función save_scraping_results para ejecutar y guardar el scraping de las URLs
-        scraping_results = await save_scraping_results([request.url], request.folderUUID, ScraperSimple)
+        scraping_results = await save_scraping_results([request.url], request.folderUUID, ScraperTiered)
         
         # Devolvemos solo el primer resultado de la lista
         return {
@@ -132,10 +297,10 @@ async def generate_uuid_folder(location_data: LocationData):
         # Crear la carpeta si no existe
         os.makedirs(folder_path, exist_ok=True)
         
-        # Crear un archivo en la carpeta con los detalles de la ubicación
+        # Guardar en el segmento de la carpeta los detalles de la ubicación
         file_path = os.path.join(folder_path, "location_data.json")
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump({"locationName": location_data.locationName, "folderUUID": folder_uuid}, file, indent=4)
+        details = json.dumps({"locationName": location_data.locationName, "folderUUID": folder_uuid}, indent=4)
+        await asyncio.to_thread(get_folder_store(folder_path).put, "location_data.json", details)
 
         return {"message": "Folder and file created", "folder_uuid": folder_uuid, "file_path": file_path}
     
@@ -155,7 +320,7 @@ class LocationData(BaseModel):
 async def start_travel_plan(location_data: LocationData):
     try:
         # Llama a save_scraping_results con las URLs de eventos proporcionadas por el frontend
-        scraper_class = ScraperSimple
+        scraper_class = ScraperTiered
         scraping_results = await save_scraping_results(location_data.urls, location_data.folderUUID, scraper_class)
 
         # Devuelve solo los resultados del scraping, sin plan de viaje
@@ -168,6 +333,142 @@ async def start_travel_plan(location_data: LocationData):
         raise HTTPException(status_code=500, detail=f"Error in scraping process: {str(e)}")
 
 
+# Variante en streaming: una línea NDJSON por URL en cuanto termina su scraping
+@app.post("/start_travel_plan_stream/")
+async def start_travel_plan_stream(location_data: LocationData):
+    async def events():
+        count = 0
+        try:
+            async for result in iter_scraping_results(location_data.urls, location_data.folderUUID, ScraperTiered):
+                count += 1
+                yield ndjson({"event": "result", **result})
+        except Exception as e:
+            yield ndjson({"event": "error", "detail": f"Error in scraping process: {str(e)}"})
+            return
+        yield ndjson({"event": "done", "message": "Event scraping completed", "count": count})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# Variante en segundo plano: devuelve un job_id al momento. El trabajo scrapea las URLs
+# con el motor y el pool de navegadores compartidos (el límite de Chromium es global)
+# y después deja construido el índice de la carpeta para que el primer análisis sea rápido
+class TravelPlanJobRequest(LocationData):
+    priority: int = 0  # Mayor prioridad sale antes de la cola
+
+
+async def run_travel_plan_job(job, report):
+    payload = job["payload"]
+    statuses = {}
+    folder_path = os.path.join("data", payload["folderUUID"])
+    os.makedirs(folder_path, exist_ok=True)
+    # Todo el trabajo (scraping e índice) con la carpeta marcada en uso para el recolector
+    with folder_in_use(folder_path):
+        # Las URLs ya guardadas salen como "Already exists": reintentar tras un reinicio no repite trabajo
+        async for result in iter_scraping_results(payload["urls"], payload["folderUUID"], ScraperTiered):
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            report({"event": "result", **result})
+
+        report({"event": "indexing"})
+        try:
+            analyzer = await asyncio.to_thread(analyzer_cache.get, folder_path)
+            index = {"version": analyzer.index_store.version, "nodes": analyzer.index_store.num_nodes}
+            report({"event": "indexed", **index})
+        except Exception as e:
+            # El scraping ya está guardado; el índice se volverá a intentar en el primer análisis
+            print("Error construyendo el índice:", str(e))
+            index = {"error": str(e)}
+            report({"event": "index_error", "detail": str(e)})
+    return {"scraping": statuses, "index": index}
+
+
+get_job_queue().register("travel_plan", run_travel_plan_job)
+
+
+@app.post("/start_travel_plan_job/")
+async def start_travel_plan_job(request: TravelPlanJobRequest):
+    payload = {"locationName": request.locationName, "folderUUID": request.folderUUID, "urls": request.urls}
+    job_id = await asyncio.to_thread(get_job_queue().submit, "travel_plan", payload, request.priority)
+    return {"message": "Job queued", "job_id": job_id}
+
+
+# Búsqueda, scraping e indexado solapados en una sola operación (NDJSON). Cada enlace se
+# scrapea en cuanto sale de la búsqueda y cada página se embebe en cuanto se guarda, así
+# /analyze_data/ responde con lo ya indexado mientras siguen llegando páginas
+class SearchScrapeRequest(BaseModel):
+    subject: str
+    folderUUID: str
+    subjects: List[str] = []  # Búsquedas adicionales; sus enlaces se scrapean en la misma carpeta
+
+
+@app.post("/search_scrape_index_stream/")
+async def search_scrape_index_stream(request: SearchScrapeRequest):
+    folder_path = os.path.join("data", request.folderUUID)
+    os.makedirs(folder_path, exist_ok=True)
+    deduplicator = await asyncio.to_thread(FolderDeduplicator, folder_path)
+    engine = get_scraping_engine()
+
+    def file_path_for(url):
+        return os.path.join(folder_path, f"{hashlib.md5(url.encode()).hexdigest()}.txt")
+
+    async def scrape(url):
+        if deduplicator.store.exists(os.path.basename(file_path_for(url))):
+            return {"url": url, "content": None, "error": None, "tier": None, "exists": True}
+        return await engine.scrape_one(url, ScraperTiered)
+
+    async def store(result):
+        file_path = file_path_for(result["url"])
+        if result.get("exists"):
+            # Ya estaba en la carpeta: pasa igual al indexado por si el índice aún no lo tiene
+            return {"url": result["url"], "file": file_path, "status": "Already exists"}
+        return await store_scraping_result(result, file_path, deduplicator)
+
+    def index():
+        analyzer = analyzer_cache.get(folder_path)
+        return {"version": analyzer.index_store.version, "nodes": analyzer.index_store.num_nodes}
+
+    pipeline = SearchScrapeIndexPipeline(
+        folder_path, (await components.get("search")).run_simple_search_async, scrape, store, index,
+    )
+
+    async def events():
+        try:
+            with folder_in_use(folder_path):
+                async for event in pipeline.run([request.subject, *request.subjects]):
+                    yield ndjson(event)
+        except Exception as e:
+            yield ndjson({"event": "error", "detail": f"Error in pipeline: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# Estado del trabajo y eventos desde `after` (para consultar periódicamente)
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, after: int = 0):
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return {**job, "events": await asyncio.to_thread(get_job_queue().events, job_id, after)}
+
+
+# Suscripción: NDJSON con el historial y luego cada evento en vivo hasta que el trabajo termina
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, after: int = 0):
+    if await asyncio.to_thread(get_job_queue().get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    async def events():
+        async for event in get_job_queue().subscribe(job_id, after):
+            yield ndjson(event)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/job_stats/")
+async def job_stats():
+    return await asyncio.to_thread(get_job_queue().stats)
+
+
 # _________________________________________________________________
 
 
@@ -186,12 +487,14 @@ async def analyze_data(request: AnalyzeDataRequest):
         if not os.path.exists(folder_path):
             raise HTTPException(status_code=404, detail="Carpeta no encontrada")
         
-        # Crear la instancia de LlamaIndexAnalyzer y cargar archivos
-        analyzer = LlamaIndexAnalyzer(folder_path)
-        analyzer.load_and_index_files()
-        
-        # Ejecutar la consulta y obtener respuesta y contexto adicional
-        result = analyzer.query(request.query)
+        # Reutilizar el analizador de la carpeta si ya está cargado (y la carpeta no cambió).
+        # Carga y consulta son bloqueantes: se ejecutan fuera del event loop
+        # Con un pipeline llenando la carpeta se usa el último índice publicado
+        with folder_in_use(folder_path):
+            analyzer = await asyncio.to_thread(analyzer_cache.get, folder_path, folder_path in active_folders)
+
+            # Ejecutar la consulta y obtener respuesta y contexto adicional
+            result = await asyncio.to_thread(analyzer.query, request.query)
         
         # Verificar si `result` contiene la estructura esperada
         clean_response = {
@@ -206,6 +509,48 @@ async def analyze_data(request: AnalyzeDataRequest):
         
         return clean_response
     
+    except HTTPException:
+        raise
     except Exception as e:
         print("Error en el análisis:", str(e))  # Imprimir el error para depuración
         raise HTTPException(status_code=500, detail=f"Error en el análisis: {str(e)}")
+
+
+# Variante en streaming: primero el contexto recuperado y luego los tokens del LLM
+@app.post("/analyze_data_stream/")
+async def analyze_data_stream(request: AnalyzeDataRequest):
+    folder_path = os.path.join("data", request.folderUUID)
+    if not os.path.exists(folder_path):
+        raise HTTPException(status_code=404, detail="Carpeta no encontrada")
+
+    try:
+        with folder_in_use(folder_path):
+            analyzer = await asyncio.to_thread(analyzer_cache.get, folder_path, folder_path in active_folders)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en el análisis: {str(e)}")
+
+    # Generador síncrono: StreamingResponse lo recorre en el threadpool
+    def events():
+        try:
+            with folder_in_use(folder_path):
+                for event in analyzer.stream_query(request.query):
+                    yield ndjson(event)
+        except Exception as e:
+            print("Error en el análisis:", str(e))
+            yield ndjson({"event": "error", "detail": f"Error en el análisis: {str(e)}"})
+            return
+        yield ndjson({"event": "done", "message": "Análisis completado", "query": request.query})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# Aciertos, fallos y desalojos de la caché de analizadores
+@app.get("/analyzer_cache_stats/")
+async def analyzer_cache_stats():
+    return analyzer_cache.stats()
+
+
+# Aciertos de la caché semántica de respuestas
+@app.get("/query_cache_stats/")
+async def query_cache_stats():
+    return query_cache.stats()
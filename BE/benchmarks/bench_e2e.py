@@ -0,0 +1,319 @@
+"""Benchmark de extremo a extremo sin red: api.py y guardials.py contra dobles locales.
+
+- Web: FixtureSite (páginas de hoteles sintéticas por HTTP local).
+- Búsqueda: el adaptador de DuckDuckGo devuelve enlaces del FixtureSite.
+- Embeddings: ``--embeddings stub`` pasa por el cliente de OpenAI contra el
+  /v1/embeddings del StubLLMServer; ``hashing`` usa el modelo determinista en proceso.
+- LLM: StubLLMServer (compatible con OpenAI) con latencia ``--llm-latency``.
+
+Las apps corren en proceso (httpx.ASGITransport) dentro de un directorio
+temporal, así data/ y cache/ empiezan vacíos en cada ejecución. ASGITransport
+no envía los eventos de arranque: se ejecuta el lifespan de cada app a mano
+(cola de trabajos, recolector de carpetas, warm-up). Escenarios,
+en orden (cada uno usa lo que dejó el anterior):
+
+    search      POST /run_simple_search/
+    travel_plan POST /start_travel_plan/   (una carpeta por petición)
+    analyze     POST /analyze_data/        (sobre esas carpetas; la primera consulta construye el índice)
+    hotel_info  POST /generate_hotel_info/ (guardials)
+
+Para cada uno: peticiones/s, p50/p95/p99, errores y pico de RSS. El resultado
+se guarda en JSON; con --compare se muestran las diferencias con otra ejecución.
+Un escenario cuyo paquete no está instalado (crewai, nemoguardrails...) queda
+registrado con su error y el resto sigue.
+
+Uso (desde BE/):
+    python -m benchmarks.bench_e2e --requests 40 --concurrency 8 --llm-latency 0.2
+    python -m benchmarks.bench_e2e --compare cache/benchmarks/e2e-20240101-120000.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+
+from benchmarks.fixtures import FixtureSite, StubLLMServer, hashing_embedding_model
+from benchmarks.load_search import percentile
+
+BE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Las apps se importan después de cambiar al directorio temporal
+sys.path.insert(0, BE_DIR)
+SCENARIOS = ("search", "travel_plan", "analyze", "hotel_info")
+QUERIES = ["Which hotel has a rooftop pool?", "Is breakfast included?", "How far is the beach?",
+           "What do guests say about the staff?"]
+
+
+class PeakMemory:
+    """Pico de RSS del proceso mientras dura un escenario (muestreo de /proc/self/statm)."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * self._page_size
+        except OSError:
+            # Fuera de Linux: pico de toda la vida del proceso (en macOS ru_maxrss va en bytes)
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._run, name="peak-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+async def drive(client, requests, concurrency, check=None):
+    # requests: lista de (ruta, cuerpo JSON); devuelve latencias y errores.
+    # check(json) -> mensaje: errores que la app devuelve con 200 (por archivo, por URL...)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def send(path, body):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                if response.status_code != 200:
+                    errors.append(f"{response.status_code}: {response.text[:200]}")
+                elif check is not None and (problem := check(response.json())):
+                    errors.append(problem)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(path, body) for path, body in requests))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies, errors, wall, peak, extra=None):
+    summary = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "peak_rss_mb": round(peak / (1024 * 1024), 1),
+        **(extra or {}),
+    }
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def install_fake_search(site, latency):
+    # DuckDuckGo simulado: cada consulta devuelve páginas del FixtureSite (distintas por consulta)
+    from search_adapter import DuckDuckGoSearch
+
+    def _text(self, query, max_results):
+        if latency:
+            time.sleep(latency)
+        offset = sum(query.encode()) % 1000
+        return [{"title": f"Hotel {offset + i}", "body": f"Reviews of hotel {offset + i}",
+                 "href": f"{site.base_url}/page/{offset + i}"} for i in range(max_results)]
+
+    DuckDuckGoSearch._text = _text
+
+
+def pages_without_body(folders):
+    # Páginas guardadas sin ningún párrafo con cuerpo (solo títulos tras la deduplicación)
+    from near_dedup import DEDUP_MIN_WORDS
+    from segment_store import get_folder_store
+
+    problems, saved = [], 0
+    for folder in folders:
+        store = get_folder_store(os.path.join("data", folder))
+        for name in store.names((".txt",)):
+            saved += 1
+            body = store.get(name).split("\n\n", 1)[-1]
+            if not any(len(line.split()) >= DEDUP_MIN_WORDS for line in body.splitlines()):
+                problems.append(f"{folder}/{name} has no body text: {body[:80]!r}")
+    return saved, problems
+
+
+async def run_scenarios(args, site, stub):
+    results, folders = {}, []
+    lifespans = contextlib.AsyncExitStack()
+
+    async def app_client(module_name):
+        module = __import__(module_name)
+        if not getattr(module.app.state, "bench_started", False):
+            await lifespans.enter_async_context(module.app.router.lifespan_context(module.app))
+            module.app.state.bench_started = True
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app),
+                                 base_url="http://test", timeout=args.timeout)
+
+    async def scenario(name, client_factory, requests, concurrency, extra=None, check=None):
+        print(f"-> {name}: {len(requests)} requests, concurrency {concurrency}")
+        try:
+            client = await client_factory()
+        except Exception as e:
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            print(f"   skipped: {results[name]['skipped']}")
+            return
+        async with client:
+            with PeakMemory() as memory:
+                latencies, errors, wall = await drive(client, requests, concurrency, check)
+        results[name] = summarize(latencies, errors, wall, memory.peak, extra() if extra else None)
+        summary = results[name]
+        print(f"   {summary['throughput_rps']} req/s, p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+              f"p99 {summary['p99_ms']} ms, errors {summary['errors']}, peak RSS {summary['peak_rss_mb']} MiB")
+
+    if "search" in args.scenarios:
+        subjects = [f"hotels in city {i % args.distinct}" for i in range(args.requests)]
+        await scenario("search", lambda: app_client("api"),
+                       [("/run_simple_search/", {"subject": subject}) for subject in subjects], args.concurrency,
+                       check=lambda body: isinstance(body["result_content"], dict) and body["result_content"].get("error"))
+
+    if {"travel_plan", "analyze", "hotel_info"} & set(args.scenarios):
+        # Las carpetas hacen falta para analyze y hotel_info aunque no se mida travel_plan
+        requests = []
+        for i in range(args.folders):
+            folder = str(uuid.uuid4())
+            folders.append(folder)
+            urls = [f"{site.base_url}/page/{i * args.pages + page}" for page in range(args.pages)]
+            requests.append(("/start_travel_plan/", {"locationName": f"City {i}", "folderUUID": folder, "urls": urls}))
+        await scenario("travel_plan", lambda: app_client("api"), requests, args.concurrency,
+                       extra=lambda: {"pages_per_request": args.pages, "site_requests": site.requests},
+                       check=lambda body: next((r.get("error") or r["status"] for r in body["scraping_results"]
+                                                if r["status"] not in ("Saved", "Already exists")), None))
+        if "requests" in results.get("travel_plan", {}):
+            # Lo que miden analyze y hotel_info: las páginas deben conservar su texto tras la deduplicación
+            saved, problems = await asyncio.to_thread(pages_without_body, folders)
+            summary = results["travel_plan"]
+            summary.update(saved_pages=saved, pages_without_body=len(problems))
+            if problems:
+                summary["errors"] += len(problems)
+                summary.setdefault("first_error", problems[0])
+                print(f"   {len(problems)} of {saved} saved pages have no body text")
+
+    if "analyze" in args.scenarios:
+        requests = [("/analyze_data/", {"folderUUID": folders[i % len(folders)], "query": QUERIES[i % len(QUERIES)]})
+                    for i in range(args.requests)]
+        await scenario("analyze", lambda: app_client("api"), requests, args.concurrency,
+                       extra=lambda: {"llm_calls": stub.calls, "embedding_calls": stub.embedding_calls})
+
+    if "hotel_info" in args.scenarios:
+        calls_before = stub.calls
+        requests = [("/generate_hotel_info/", {"uuid": folders[i % len(folders)]}) for i in range(args.folders)]
+        await scenario("hotel_info", lambda: app_client("guardials"), requests, args.concurrency,
+                       extra=lambda: {"llm_calls": stub.calls - calls_before},
+                       check=lambda body: next((r["error"] for r in body["responses"] if "error" in r), None))
+
+    # Apagado de las apps arrancadas (workers, recolector, navegador, cliente HTTP)
+    await lifespans.aclose()
+    try:
+        from tiered_fetcher import get_http_fetcher
+        await get_http_fetcher().close()
+    except Exception:
+        pass
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nvs {previous_path} ({previous.get('commit')}):")
+    print(f"{'scenario':<12} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for name, after in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name, {})
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            if isinstance(before.get(metric), (int, float)) and isinstance(after.get(metric), (int, float)):
+                change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+                print(f"{name:<12} {metric:<15} {before[metric]:>10} {after[metric]:>10} {change:>+7.1f}%")
+
+
+def main(args):
+    output = os.path.abspath(args.output or os.path.join(
+        "cache", "benchmarks", f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    shutil.copytree(os.path.join(BE_DIR, "config"), os.path.join(workdir, "config"))
+
+    with FixtureSite(paragraphs=args.paragraphs) as site, \
+            StubLLMServer(latency=args.llm_latency, embed_latency=args.embed_latency) as stub:
+        # Antes de importar las apps: todo cliente de OpenAI (LlamaIndex, LangChain, rails) va al stub
+        os.environ.update({"OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": stub.base_url,
+                           "OPENAI_API_BASE": stub.base_url, "EMBED_BACKEND": "openai"})
+        if args.embeddings == "hashing":
+            from llama_index.core import Settings
+            Settings.embed_model = hashing_embedding_model()
+        install_fake_search(site, args.search_latency)
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            scenarios = asyncio.run(run_scenarios(args, site, stub))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "e2e",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults saved to {output}")
+    if compare_path:
+        compare(report, compare_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=40, help="peticiones de search y analyze")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct", type=int, default=10, help="destinos distintos en search")
+    parser.add_argument("--folders", type=int, default=4, help="peticiones de travel_plan (una carpeta cada una)")
+    parser.add_argument("--pages", type=int, default=5, help="URLs por travel_plan")
+    parser.add_argument("--paragraphs", type=int, default=20, help="párrafos por página del FixtureSite")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--embeddings", choices=["stub", "hashing"], default="stub")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="archivo JSON de resultados (por defecto cache/benchmarks/e2e-<fecha>.json)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    main(parser.parse_args())
@@ -0,0 +1,62 @@
+"""Sequential vs concurrent /generate_hotel_info/ against a stubbed local LLM.
+
+The rails cache lives in the temporary folder and is emptied before every pass,
+so both passes send every file to the (stub) LLM: the speedup is the fan-out's.
+
+Usage (from BE/):
+    python -m benchmarks.bench_guardrails --latency 0.5 --files 5 20 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import StubLLMServer, fixture_page
+
+
+def write_folder(root, uuid, count):
+    folder = os.path.join(root, "data", uuid)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(folder, f"page_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"URL: http://fixture/{i}\n\n{fixture_page(i)}")
+
+
+async def run(guardials, uuid, concurrency):
+    guardials.rails_cache.clear()
+    guardials.rails_semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    result = await guardials.generate_hotel_info(guardials.UUIDRequest(uuid=uuid))
+    errors = sum("error" in entry for entry in result["responses"])
+    return time.perf_counter() - start, errors
+
+
+async def main(args):
+    with StubLLMServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as root:
+        # Point the OpenAI client used by the rails at the stub before building them, and keep
+        # the rails cache out of BE/cache (a warm cache would turn both passes into hits)
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ["OPENAI_API_BASE"] = stub.base_url
+        os.environ["RAILS_CACHE_PATH"] = os.path.join(root, "rails_cache.sqlite3")
+        import guardials
+
+        os.chdir(root)
+        print(f"{'files':>5} {'sequential':>12} {'concurrent':>12} {'speedup':>8}")
+        for count in args.files:
+            uuid = f"bench_{count}"
+            write_folder(root, uuid, count)
+            sequential, errors_seq = await run(guardials, uuid, 1)
+            concurrent, errors_con = await run(guardials, uuid, args.concurrency)
+            print(f"{count:>5} {sequential:>11.2f}s {concurrent:>11.2f}s {sequential / concurrent:>7.1f}x"
+                  + (f"  errors: {errors_seq}/{errors_con}" if errors_seq or errors_con else ""))
+        print(f"stub LLM calls: {stub.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM latency per call (s)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--files", type=int, nargs="+", default=[5, 20, 50])
+    asyncio.run(main(parser.parse_args()))
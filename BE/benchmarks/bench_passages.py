@@ -0,0 +1,103 @@
+"""BM25 passage selection vs plain truncation for the rails' 4000-character budget.
+
+Quality is measured offline as the share of hotel facts that reach the rails:
+synthetic pages start with navigation, cookie and destination text and carry
+known hotel facts further down. With --folder, real scraped files are scored
+by hotel-term hits per token instead.
+
+Usage (from BE/):
+    python -m benchmarks.bench_passages --pages 50
+    python -m benchmarks.bench_passages --folder data/<uuid>
+"""
+import argparse
+import random
+import re
+import time
+
+from passage_selector import HOTEL_TERMS, select_passages
+from segment_store import get_folder_store
+
+BUDGET = 4000
+CHARS_PER_TOKEN = 4
+
+BOILERPLATE = [
+    "Home Destinations Deals Flights Cars Cruises Activities Travel guides Help centre Sign in Register",
+    "We use cookies to personalise content and ads, to provide social media features and to analyse our traffic.",
+    "Discover the old town, its cathedral and the maritime museum, then take the cable car up the hill at sunset.",
+    "The city was founded by traders in the twelfth century and its harbour became one of the busiest ports.",
+    "Festivals take over the main square every summer with concerts, street food and fireworks over the river.",
+    "Download our app to get exclusive offers, manage your trips and receive notifications about price drops.",
+]
+FACTS = [
+    "Rooms at the hotel start at {price} euros per night and include breakfast served on the terrace.",
+    "Guests rated the staff {score} out of 10 and praised the clean bathrooms and comfortable beds.",
+    "The hotel pool is open from 8 to 20 and the spa offers massages for guests who book in advance.",
+    "Free wifi is available in all rooms and private parking costs {parking} euros per night.",
+    "The hotel is located a {minutes} minute walk from the beach with views over the bay from the balcony.",
+    "Reviews mention a quiet location, though some guests found the rooms facing the street noisy.",
+]
+
+
+def synthetic_page(rng):
+    # Destination text first, facts scattered after it: what a scraped listing page looks like
+    lines = [rng.choice(BOILERPLATE) for _ in range(rng.randint(40, 80))]
+    facts = [fact.format(price=rng.randint(60, 240), score=rng.randint(6, 10), parking=rng.randint(5, 25),
+                         minutes=rng.randint(2, 15)) for fact in FACTS]
+    for fact in facts:
+        lines.insert(rng.randint(len(lines) // 3, len(lines)), fact)
+    return "\n".join(lines), facts
+
+
+def term_hits(text):
+    terms = set(HOTEL_TERMS)
+    return sum(token in terms for token in re.findall(r"\w+", text.lower()))
+
+
+def report(name, tokens, quality, seconds, files):
+    print(f"{name:<10} {tokens / files:>11.0f} {quality:>16.3f} {seconds / files * 1000:>9.2f} ms/file")
+
+
+def run_synthetic(pages, seed):
+    rng = random.Random(seed)
+    corpus = [synthetic_page(rng) for _ in range(pages)]
+    print(f"{'strategy':<10} {'tokens/file':>11} {'facts recalled':>16} {'selection':>9}")
+    for name, select in (("truncate", lambda text: text[:BUDGET]),
+                         ("bm25", lambda text: select_passages(text, BUDGET))):
+        start = time.perf_counter()
+        selected = [select(text) for text, _ in corpus]
+        seconds = time.perf_counter() - start
+        recalled = sum(fact in text for text, (_, facts) in zip(selected, corpus) for fact in facts)
+        tokens = sum(len(text) for text in selected) / CHARS_PER_TOKEN
+        report(name, tokens, recalled / (pages * len(FACTS)), seconds, pages)
+
+
+def run_folder(folder):
+    texts = []
+    store = get_folder_store(folder)
+    for name in store.names((".txt",)):
+        texts.append(re.sub(r"URL:.*\n?", "", store.get(name)).strip())
+    if not texts:
+        print(f"No .txt files in {folder}")
+        return
+    print(f"{len(texts)} files, {sum(len(t) > BUDGET for t in texts)} over the {BUDGET}-character budget")
+    print(f"{'strategy':<10} {'tokens/file':>11} {'term hits/1k tok':>16} {'selection':>9}")
+    for name, select in (("truncate", lambda text: text[:BUDGET]),
+                         ("bm25", lambda text: select_passages(text, BUDGET))):
+        start = time.perf_counter()
+        selected = [select(text) for text in texts]
+        seconds = time.perf_counter() - start
+        tokens = sum(len(text) for text in selected) / CHARS_PER_TOKEN
+        hits = sum(term_hits(text) for text in selected)
+        report(name, tokens, hits / tokens * 1000 if tokens else 0.0, seconds, len(texts))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50, help="synthetic pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", help="score real scraped files instead of synthetic pages")
+    args = parser.parse_args()
+    if args.folder:
+        run_folder(args.folder)
+    else:
+        run_synthetic(args.pages, args.seed)
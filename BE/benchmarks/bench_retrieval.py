@@ -0,0 +1,102 @@
+"""Recall@k y latencia de cada modo de CustomRetriever sobre un corpus de .txt scrapeados.
+
+Las consultas se generan del propio corpus: se toma un fragmento de un nodo y
+se espera recuperar ese nodo. El índice se construye en una copia temporal de
+la carpeta, así que nunca se toca el .index real.
+
+Uso (desde BE/):
+    python -m benchmarks.bench_retrieval --folder data/<folderUUID> --k 4
+    python -m benchmarks.bench_retrieval --offline      # corpus sintético + embeddings locales
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from llama_index.core import Settings, QueryBundle
+
+from benchmarks.fixtures import hotel_facts, hashing_embedding_model
+from index_store import FolderIndexStore
+from segment_store import get_folder_store
+from LlamaIndexValidator import CustomRetriever, StoreVectorRetriever, StoreKeywordRetriever
+
+
+def synthetic_corpus(folder, pages=40):
+    # Texto plano con hechos distintos en cada párrafo: una consulta sacada de un nodo
+    # solo coincide con ese nodo, así recall@k no depende de cómo se desempatan textos iguales
+    rng = random.Random(3)
+    amenities = ["pool", "spa", "gym", "breakfast", "parking", "rooftop bar", "beach access", "wifi"]
+    store = get_folder_store(folder)
+    for i in range(pages):
+        picked = rng.sample(amenities, 3)
+        store.put(f"page_{i}.txt", f"URL: http://fixture/{i}\n\nHotel {i} offers {', '.join(picked)} "
+                                   f"in district {rng.randint(1, 12)}.\n" + "\n".join(hotel_facts(i, 3)))
+
+
+def make_queries(store, count, words, seed=11):
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(range(store.num_nodes), min(count, store.num_nodes)):
+        node = store.get_node(row)
+        tokens = node.text.split()
+        if len(tokens) < words:
+            continue
+        start = rng.randint(0, len(tokens) - words)
+        queries.append((" ".join(tokens[start:start + words]), node.node_id))
+    return queries
+
+
+def main(args):
+    if args.offline:
+        Settings.embed_model = hashing_embedding_model()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.folder:
+            source = get_folder_store(args.folder)
+            target = get_folder_store(folder)
+            for name in source.names((".txt",)):
+                target.put(name, source.get(name))
+        else:
+            synthetic_corpus(folder)
+
+        start = time.perf_counter()
+        store = FolderIndexStore(folder).update()
+        print(f"index: {store.num_nodes} nodes in {time.perf_counter() - start:.2f}s")
+
+        queries = make_queries(store, args.queries, args.words)
+        # Embedding precalculado: se mide la recuperación, no la llamada al modelo
+        bundles = [(QueryBundle(q, embedding=Settings.embed_model.get_query_embedding(q)), target)
+                   for q, target in queries]
+
+        modes = [("AND", "rrf"), ("OR", "rrf"), ("FUSED", "rrf"), ("FUSED", "weighted")]
+        print(f"{'mode':<16} {'recall@' + str(args.k):>9} {'empty':>6} {'p50 ms':>8} {'mean ms':>8}")
+        for mode, fusion in modes:
+            fused = mode == "FUSED"
+            retriever = CustomRetriever(
+                StoreVectorRetriever(store, similarity_top_k=args.candidates if fused else 2),
+                StoreKeywordRetriever(store, num_chunks_per_query=args.candidates if fused else 10),
+                mode=mode, top_k=args.k, fusion=fusion,
+            )
+            hits, empty, latencies = 0, 0, []
+            for bundle, target in bundles:
+                start = time.perf_counter()
+                nodes = retriever.retrieve(bundle)
+                latencies.append(time.perf_counter() - start)
+                empty += not nodes
+                hits += target in {n.node.node_id for n in nodes}
+            name = f"{mode}/{fusion}" if fused else mode
+            print(f"{name:<16} {hits / len(bundles):>9.3f} {empty:>6} "
+                  f"{statistics.median(latencies) * 1000:>8.2f} {statistics.mean(latencies) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--folder", help="carpeta data/<folderUUID> con los .txt scrapeados")
+    parser.add_argument("--offline", action="store_true", help="embeddings locales deterministas")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--words", type=int, default=8, help="palabras por consulta")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""Páginas/segundo del scraping contra un sitio HTTP local.
+
+Uso (desde BE/):
+    python -m benchmarks.bench_scraping --pages 20 --delay 0.2 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fixtures import FixtureSite
+from browser_pool import get_browser_pool
+from scraping_engine import ScrapingEngine
+from Scraper import ScraperSimple, ScraperTiered
+from tiered_fetcher import get_http_fetcher, tier_stats
+
+
+async def run_sequential(urls):
+    # Comportamiento anterior: un Chromium nuevo por URL, una URL detrás de otra
+    from langchain_community.document_loaders import AsyncChromiumLoader
+    from langchain_community.document_transformers import BeautifulSoupTransformer
+
+    for url in urls:
+        docs = await AsyncChromiumLoader([url]).aload()
+        BeautifulSoupTransformer().transform_documents(docs, tags_to_extract=["p", "h1", "h2"])
+
+
+async def run_engine(urls, concurrency, per_host, scraper_class=ScraperSimple):
+    engine = ScrapingEngine(max_concurrency=concurrency, per_host_concurrency=per_host)
+    errors = 0
+    async for result in engine.scrape(urls, scraper_class):
+        errors += result["error"] is not None
+    return errors
+
+
+def report(name, pages, elapsed):
+    print(f"{name:<22} {pages:>5} pages  {elapsed:8.2f}s  {pages / elapsed:8.2f} pages/s")
+
+
+async def main(args):
+    with FixtureSite(delay=args.delay) as site:
+        urls = site.urls(args.pages)
+
+        if args.baseline:
+            start = time.perf_counter()
+            await run_sequential(urls)
+            report("sequential (old)", len(urls), time.perf_counter() - start)
+
+        pool = get_browser_pool()
+        start = time.perf_counter()
+        await pool.start()
+        print(f"browser pool warm-up: {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        errors = await run_engine(urls, args.concurrency, args.per_host)
+        report(f"engine x{args.concurrency}", len(urls), time.perf_counter() - start)
+        if errors:
+            print(f"  {errors} errors")
+
+        # Páginas estáticas: el nivel HTTP debería servirlas sin tocar Chromium
+        start = time.perf_counter()
+        errors = await run_engine(urls, args.concurrency, args.per_host, ScraperTiered)
+        report(f"tiered x{args.concurrency}", len(urls), time.perf_counter() - start)
+        print(f"  tiers: {tier_stats.snapshot()['tiers']}")
+        await get_http_fetcher().close()
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.2, help="latencia simulada por página (s)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=8, help="el sitio de prueba es un solo host")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+"""Memoria por worker con el mismo índice abierto en varios procesos (como uvicorn --workers N).
+
+Cada worker abre el índice de una carpeta grande, lo recorre entero (vectores,
+textos de los nodos y tabla de palabras clave) y, con todos los workers vivos,
+mide su memoria en /proc/self/smaps_rollup (solo Linux). Se compara:
+
+- mmap: el FolderIndexStore tal cual, todo por mmap de solo lectura.
+- copy: lo mismo copiado a memoria del proceso (lo que hacía el índice en pickle).
+
+Columnas (MiB, media por worker, descontando lo que el proceso usaba antes de abrir el índice):
+privada = páginas solo de ese worker; PSS = páginas compartidas divididas entre los procesos que
+las usan. Con mmap la privada se queda en ~0 y el PSS total no crece al añadir workers.
+
+Uso (desde BE/):
+    python -m benchmarks.bench_shared_memory --pages 2000 --workers 1 2 4
+"""
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+
+from llama_index.core import Settings
+
+from benchmarks.fixtures import hashing_embedding_model
+from segment_store import get_folder_store
+from text_chunker import CHUNK_SEPARATOR
+
+VOCABULARY = ["hotel", "room", "suite", "pool", "spa", "gym", "breakfast", "beach", "view", "staff",
+              "quiet", "clean", "parking", "wifi", "bar", "terrace", "garden", "family", "price", "night"]
+MIB = 1024 * 1024
+
+
+def synthetic_folder(folder, pages, chunks, seed=5):
+    # Fragmentos ya separados como los deja el scraper: un nodo por fragmento
+    rng = random.Random(seed)
+    store = get_folder_store(folder)
+    for page in range(pages):
+        fragments = []
+        for chunk in range(chunks):
+            words = rng.choices(VOCABULARY, k=60) + [f"district{rng.randint(1, 500)}", f"hotel{page}x{chunk}"]
+            rng.shuffle(words)
+            fragments.append(" ".join(words))
+        store.put(f"page_{page}.txt", f"URL: http://fixture/{page}\n\n" + f"\n{CHUNK_SEPARATOR}\n".join(fragments))
+
+
+def memory():
+    # kB -> bytes de los campos que interesan de smaps_rollup
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def worker(folder, mode, loaded, measured, results):
+    import numpy as np
+    from index_store import FolderIndexStore
+
+    before = memory()
+    store = FolderIndexStore(folder).open()
+    terms = [term for term, _ in store.keywords.items()]
+    if mode == "copy":
+        vectors = np.array(store.vectors)
+        records = [store._raw_record(row) for row in range(store.num_nodes)]
+        keywords = {term: list(store.keywords.get(term)) for term in terms}
+        touched = float((vectors @ vectors[0]).sum()) + len(records) + len(keywords)
+    else:
+        # Recorre todo para que las páginas estén cargadas, sin guardar copias
+        touched = float((store.vectors @ np.asarray(store.vectors[0])).sum())
+        touched += sum(len(store._raw_record(row)) for row in range(store.num_nodes))
+        touched += sum(len(store.keywords.get(term)) for term in terms)
+    loaded.wait()
+    after = memory()
+    results.put({key: after[key] - before[key] for key in after} | {"touched": touched})
+    # Nadie sale hasta que todos han medido: las páginas compartidas siguen compartidas
+    measured.wait()
+
+
+def run(folder, mode, workers):
+    context = multiprocessing.get_context("spawn")
+    loaded, measured = context.Barrier(workers), context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(folder, mode, loaded, measured, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(sample[key] for sample in samples) / workers for key in ("rss", "private", "pss")}
+
+
+def main(args):
+    Settings.embed_model = hashing_embedding_model(args.dim)
+    from index_store import FolderIndexStore
+
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_folder(folder, args.pages, args.chunks)
+        start = time.perf_counter()
+        store = FolderIndexStore(folder).update()
+        size = store.size_bytes
+        print(f"index: {store.num_nodes} nodes, {size / MIB:.1f} MiB (vectors + nodes), "
+              f"built in {time.perf_counter() - start:.1f}s")
+        store.close()
+
+        print(f"{'mode':<6} {'workers':>7} {'rss/worker':>10} {'private/worker':>14} "
+              f"{'pss/worker':>10} {'pss total':>9}")
+        for mode in ("mmap", "copy"):
+            for workers in args.workers:
+                result = run(folder, mode, workers)
+                print(f"{mode:<6} {workers:>7} {result['rss'] / MIB:>10.1f} {result['private'] / MIB:>14.1f} "
+                      f"{result['pss'] / MIB:>10.1f} {result['pss'] * workers / MIB:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=10, help="fragmentos (nodos) por página")
+    parser.add_argument("--dim", type=int, default=768, help="dimensión de los embeddings")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    main(parser.parse_args())
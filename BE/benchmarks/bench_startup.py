@@ -0,0 +1,80 @@
+"""Tiempo de arranque de api.py / guardials.py y de la carga de cada componente pesado.
+
+Cada medición va en un proceso nuevo (como un réplica recién escalada): se
+mide cuánto tarda el import del módulo de la app, qué módulos pesados quedaron
+cargados por el import y, después, cuánto tarda en cargarse cada componente de
+``warmup.components`` (lo que pagaría la primera petición que lo necesite, o la
+precarga con WARMUP). Un componente cuyo paquete no está instalado sale como error.
+
+Uso (desde BE/):
+    python -m benchmarks.bench_startup --app api --runs 5 --warm llama_index search
+    python -m benchmarks.bench_startup --app guardials --warm rails
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("crewai", "langchain_community", "llama_index", "playwright", "nemoguardrails")
+
+
+def child(app, warm):
+    start = time.perf_counter()
+    __import__(app)
+    import_seconds = time.perf_counter() - start
+    loaded = [name for name in HEAVY_MODULES
+              if any(module == name or module.startswith(name + ".") for module in sys.modules)]
+
+    from warmup import components
+
+    async def load_all():
+        timings = {}
+        for name in warm:
+            start = time.perf_counter()
+            try:
+                await components.get(name)
+                timings[name] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                timings[name] = f"error: {type(e).__name__}: {e}"
+        return timings
+
+    print(json.dumps({"import": import_seconds, "heavy_loaded": loaded, "components": asyncio.run(load_all())}))
+
+
+def main(args):
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", "--app", args.app, "--warm", *args.warm],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        # La última línea es el resultado; lo anterior son prints de los módulos
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    imports = [run["import"] for run in runs]
+    print(f"{args.app}: import p50 {statistics.median(imports) * 1000:.0f} ms, "
+          f"min {min(imports) * 1000:.0f} ms, max {max(imports) * 1000:.0f} ms ({args.runs} runs)")
+    print(f"heavy modules loaded by the import: {', '.join(runs[0]['heavy_loaded']) or 'none'}")
+    for name in args.warm:
+        values = [run["components"][name] for run in runs]
+        numbers = [value for value in values if isinstance(value, float)]
+        if numbers:
+            print(f"  first use of {name:<12} p50 {statistics.median(numbers) * 1000:>7.0f} ms")
+        else:
+            print(f"  first use of {name:<12} {values[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="api", choices=["api", "guardials"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm", nargs="*", default=[], help="componentes a cargar tras el import")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.app, args.warm)
+    else:
+        main(args)
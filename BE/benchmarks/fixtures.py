@@ -0,0 +1,257 @@
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Frases de reseña con huecos. Cada párrafo junta dos con valores al azar (semilla por
+# página): los párrafos no se parecen entre sí y la deduplicación de carpetas los conserva
+FACT_TEMPLATES = (
+    "Room {room} on floor {floor} faces the {view} and has a {bed} bed that {guest} found {adjective}.",
+    "Breakfast is served from {hour} in the {place}, with {food} and {drink} that regulars call {adjective}.",
+    "The {amenity} opens at {hour} and costs {price} euros per day for guests staying {nights} nights.",
+    "Walking to the {landmark} takes about {minutes} minutes along {street}, past a {shop}.",
+    "{guest} stayed in {month} and wrote that the {staff} helped with {request} within {minutes} minutes.",
+    "Parking in the {garage} is {price} euros a night and fits {spaces} cars near the {landmark}.",
+    "During {month} the {amenity} gets busy after {hour}, so {guest} suggests booking a slot at reception.",
+    "A {bed} suite with a {view} view was rated {score} out of 10 for cleanliness by {guest}.",
+    "The {staff} speaks {language} and arranged a {request} to the {landmark} for {price} euros.",
+    "Checkout is at {hour} and late departure until {late} adds {price} euros, according to {guest}.",
+)
+FACT_VALUES = {
+    "view": ["harbour", "old town", "courtyard", "mountains", "river", "cathedral", "market square"],
+    "bed": ["king size", "twin", "queen", "double", "sofa", "bunk"],
+    "guest": ["Maria", "Tom", "a family from Lyon", "two students", "an elderly couple", "Kenji", "Ana"],
+    "adjective": ["spotless", "noisy", "generous", "disappointing", "charming", "cramped", "excellent"],
+    "hour": ["6:30", "7:00", "7:45", "8:15", "9:00", "10:30", "11:00"],
+    "late": ["13:00", "14:00", "15:30", "16:00"],
+    "place": ["garden terrace", "basement hall", "lobby cafe", "rooftop lounge", "winter garden"],
+    "food": ["fresh pastries", "local cheese", "scrambled eggs", "tropical fruit", "churros", "smoked salmon"],
+    "drink": ["espresso", "orange juice", "mint tea", "cava", "hot chocolate"],
+    "amenity": ["spa", "gym", "rooftop pool", "sauna", "tennis court", "kids club", "cinema room"],
+    "landmark": ["beach", "central station", "museum", "old port", "football stadium", "botanical garden"],
+    "street": ["the promenade", "Calle Mayor", "the riverside path", "Rue Royale", "a quiet alley"],
+    "shop": ["bakery", "bookshop", "pharmacy", "flower stall", "bike rental", "wine bar"],
+    "month": ["January", "March", "May", "July", "August", "October", "December"],
+    "staff": ["concierge", "night porter", "front desk team", "housekeeper", "bar manager"],
+    "request": ["a taxi", "theatre tickets", "an extra pillow", "a birthday cake", "a boat tour"],
+    "garage": ["underground garage", "open lot", "valet area", "public car park"],
+    "language": ["German", "Japanese", "Portuguese", "Italian", "Arabic", "Dutch"],
+}
+
+
+def hotel_facts(index, count=20):
+    """``count`` párrafos de texto plano distintos sobre el hotel ``index`` (deterministas)."""
+    rng = random.Random(f"hotel-{index}")
+    paragraphs = []
+    for i in range(count):
+        sentences = []
+        for template in rng.sample(FACT_TEMPLATES, 2):
+            values = {key: rng.choice(options) for key, options in FACT_VALUES.items()}
+            values.update(room=rng.randint(100, 999), floor=rng.randint(1, 12), price=rng.randint(5, 90),
+                          nights=rng.randint(2, 9), minutes=rng.randint(3, 40), spaces=rng.randint(10, 200),
+                          score=rng.randint(4, 10))
+            sentences.append(template.format(**values))
+        paragraphs.append(f"Hotel {index}, review {i}: " + " ".join(sentences))
+    return paragraphs
+
+
+def fixture_page(index, paragraphs=20):
+    body = "".join(f"<p>{paragraph}</p>" for paragraph in hotel_facts(index, paragraphs))
+    return (
+        f"<html><head><title>Hotel {index}</title></head><body>"
+        f"<nav><a href='/'>Home</a></nav><h1>Hotel {index}</h1><h2>Reviews</h2>{body}"
+        f"</body></html>"
+    )
+
+
+class FixtureSite:
+    """Sitio HTTP local con páginas de hoteles sintéticas para los benchmarks.
+
+    ``/page/<n>`` devuelve una página; ``?delay=<s>`` simula latencia de red.
+    """
+
+    def __init__(self, delay=0.0, paragraphs=20):
+        self.delay = delay
+        self.paragraphs = paragraphs
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self, count):
+        return [f"{self.base_url}/page/{i}" for i in range(count)]
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests += 1
+                parsed = urlparse(self.path)
+                delay = float(parse_qs(parsed.query).get("delay", [site.delay])[0])
+                if delay:
+                    time.sleep(delay)
+                if not parsed.path.startswith("/page/"):
+                    self.send_error(404)
+                    return
+                body = fixture_page(parsed.path.rsplit("/", 1)[-1], site.paragraphs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubLLMServer:
+    """Endpoint local compatible con la API de OpenAI con latencia configurable.
+
+    Responde /v1/chat/completions y /v1/completions con un texto fijo y
+    /v1/embeddings con vectores deterministas (``hashing_vector``), para medir la
+    orquestación sin depender de un modelo real.
+    """
+
+    def __init__(self, latency=0.5, reply="The hotel offers a pool, breakfast and beach access.",
+                 embed_latency=0.0, embed_dim=256):
+        self.latency = latency
+        self.reply = reply
+        self.embed_latency = embed_latency
+        self.embed_dim = embed_dim
+        self.calls = 0
+        self.embedding_calls = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.endswith("/embeddings"):
+                    self._embeddings(json.loads(request or b"{}"))
+                    return
+                with stub._lock:
+                    stub.calls += 1
+                time.sleep(stub.latency)
+                usage = {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+                if self.path.endswith("/chat/completions"):
+                    choice = {"index": 0, "finish_reason": "stop",
+                              "message": {"role": "assistant", "content": stub.reply}}
+                    payload = {"object": "chat.completion", "choices": [choice]}
+                elif self.path.endswith("/completions"):
+                    payload = {"object": "text_completion",
+                               "choices": [{"index": 0, "finish_reason": "stop", "text": stub.reply}]}
+                else:
+                    self.send_error(404)
+                    return
+                payload.update({"id": "stub", "created": int(time.time()), "model": "stub", "usage": usage})
+                self._send_json(payload)
+
+            def _embeddings(self, request):
+                import base64
+                import numpy as np
+
+                with stub._lock:
+                    stub.embedding_calls += 1
+                if stub.embed_latency:
+                    time.sleep(stub.embed_latency)
+                texts = request.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                data = []
+                for index, text in enumerate(texts):
+                    vector = hashing_vector(str(text), stub.embed_dim)
+                    if request.get("encoding_format") == "base64":
+                        # El SDK de openai pide base64 (float32) por defecto
+                        embedding = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode()
+                    else:
+                        embedding = vector
+                    data.append({"object": "embedding", "index": index, "embedding": embedding})
+                tokens = sum(len(str(text).split()) for text in texts)
+                self._send_json({"object": "list", "data": data, "model": request.get("model", "stub"),
+                                 "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+            def _send_json(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def hashing_vector(text, dim=256):
+    # Bolsa de palabras con hashing, normalizada: mismo texto, mismo vector en cualquier proceso
+    import hashlib
+    import re
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        digest = int.from_bytes(hashlib.md5(token.encode()).digest()[:8], "little")
+        vector[digest % dim] += 1.0 if (digest >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def hashing_embedding_model(dim=256):
+    """Modelo de embeddings determinista y sin red (bolsa de palabras con hashing).
+
+    No es semántico, pero es estable entre ejecuciones y suficiente para medir
+    latencias y comparar estrategias de recuperación offline.
+    """
+    from llama_index.core.embeddings import BaseEmbedding
+
+    class HashingEmbedding(BaseEmbedding):
+        def _embed(self, text):
+            return hashing_vector(text, dim)
+
+        def _get_query_embedding(self, query):
+            return self._embed(query)
+
+        async def _aget_query_embedding(self, query):
+            return self._embed(query)
+
+        def _get_text_embedding(self, text):
+            return self._embed(text)
+
+    return HashingEmbedding(model_name=f"hashing-{dim}", embed_batch_size=64)
@@ -0,0 +1,89 @@
+"""Prueba de carga de los endpoints de búsqueda: latencia p50/p99 con peticiones mixtas.
+
+Por defecto corre la app en proceso con un DuckDuckGo simulado (latencia fija);
+con --url ataca un servidor real en marcha.
+
+Uso (desde BE/):
+    python -m benchmarks.load_search --requests 100 --concurrency 100 --latency 0.5
+    python -m benchmarks.load_search --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def mixed_requests(count, distinct, seed=7):
+    # 70% /run_simple_search/, 20% /run_simple_search_duck/, 10% un GET ligero
+    rng = random.Random(seed)
+    subjects = [f"hotels in city {i}" for i in range(distinct)]
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            yield "POST", "/run_simple_search/", {"subject": rng.choice(subjects)}
+        elif roll < 0.9:
+            yield "POST", "/run_simple_search_duck/", {"subject": rng.choice(subjects)}
+        else:
+            yield "GET", "/search_cache_stats/", None
+
+
+def stub_search(latency):
+    # Sustituye la llamada bloqueante a DuckDuckGo por una espera fija (el adaptador procesa la respuesta)
+    from search_adapter import DuckDuckGoSearch
+
+    def _text(self, query, max_results):
+        time.sleep(latency)
+        return [{"title": f"Result {i} for {query}", "body": "stub", "href": f"http://127.0.0.1/stub/{i}"}
+                for i in range(max_results)]
+
+    DuckDuckGoSearch._text = _text
+
+
+async def main(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        stub_search(args.latency)
+        from api import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=120)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = {}
+
+    async def send(method, path, body):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            elapsed = time.perf_counter() - start
+            latencies.setdefault(path, []).append(elapsed)
+            return response.status_code
+
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(send(*req) for req in mixed_requests(args.requests, args.distinct)))
+    wall = time.perf_counter() - start
+    await client.aclose()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, wall {wall:.2f}s, "
+          f"{args.requests / wall:.1f} req/s, non-200: {sum(s != 200 for s in statuses)}")
+    print(f"{'endpoint':<28} {'n':>4} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for path, values in sorted(latencies.items()):
+        print(f"{path:<28} {len(values):>4} {percentile(values, 50) * 1000:>9.1f} "
+              f"{percentile(values, 99) * 1000:>9.1f} {statistics.mean(values) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=20, help="número de destinos distintos")
+    parser.add_argument("--latency", type=float, default=0.5, help="latencia simulada de DuckDuckGo (s)")
+    parser.add_argument("--url", help="servidor real en lugar de la app en proceso")
+    asyncio.run(main(parser.parse_args()))
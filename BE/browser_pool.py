@@ -0,0 +1,127 @@
+import os
+import asyncio
+from metrics import span
+
+# Recoge los elementos una vez en la página y luego los devuelve por tandas,
+# así nunca viaja a Python el HTML completo ni todo el texto de golpe
+COLLECT_ELEMENTS_JS = """(selector) => {
+    window.__scrapeElements = Array.from(document.querySelectorAll(selector));
+    return window.__scrapeElements.length;
+}"""
+ELEMENT_BATCH_JS = """([start, count]) => window.__scrapeElements.slice(start, start + count)
+    .map(e => [e.tagName.toLowerCase(), e.innerText || ""])"""
+
+
+class BrowserPool:
+    """Chromium headless compartido con un pool de contextos calientes.
+
+    El navegador se lanza una sola vez por proceso y cada scraping toma prestado
+    un contexto del pool en lugar de arrancar un Chromium nuevo por URL.
+    """
+
+    def __init__(self, size=None, headless=True, timeout_ms=None):
+        self.size = size or int(os.getenv("BROWSER_POOL_SIZE", "4"))
+        self.headless = headless
+        self.timeout_ms = timeout_ms or int(os.getenv("BROWSER_PAGE_TIMEOUT_MS", "30000"))
+        self._playwright = None
+        self._browser = None
+        self._contexts = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self):
+        if self.started:
+            return
+        async with self._lock:
+            if self.started:
+                return
+            # Si el navegador se cayó, liberar lo que quede antes de relanzarlo
+            await self._shutdown()
+            with span("browser_launch"):
+                # Playwright se importa con el primer lanzamiento, no al importar la API
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+                self._contexts = asyncio.Queue()
+                for _ in range(self.size):
+                    self._contexts.put_nowait(await self._browser.new_context())
+
+    async def fetch(self, url):
+        # Devuelve el HTML renderizado de la URL usando un contexto del pool
+        return await self._with_page(url, lambda page: page.content(), "content")
+
+    async def extract(self, url, sink, selector="p, h1, h2", batch_size=200):
+        # Entrega (etiqueta, texto) de cada elemento al sink por tandas, sin pasar por el HTML.
+        # Si el sink devuelve False (límite de texto alcanzado) se deja de leer la página
+        async def read(page):
+            total = await page.evaluate(COLLECT_ELEMENTS_JS, selector)
+            for start in range(0, total, batch_size):
+                for tag, text in await page.evaluate(ELEMENT_BATCH_JS, [start, batch_size]):
+                    if sink.add(tag, text) is False:
+                        return
+        await self._with_page(url, read, "extract")
+
+    async def _with_page(self, url, action, action_name):
+        await self.start()
+        contexts = self._contexts
+        with span("browser_wait_context"):
+            context = await contexts.get()
+        healthy = False
+        try:
+            page = await context.new_page()
+            try:
+                with span("browser_page_load"):
+                    await page.goto(url, timeout=self.timeout_ms)
+                with span("browser_page_read", action=action_name):
+                    result = await action(page)
+            finally:
+                await page.close()
+            healthy = True
+            return result
+        finally:
+            if not healthy:
+                # El contexto pudo quedar en mal estado: reemplazarlo por uno limpio
+                context = await self._replace_context(context)
+            contexts.put_nowait(context)
+
+    async def _replace_context(self, context):
+        try:
+            await context.close()
+        except Exception:
+            pass
+        try:
+            return await self._browser.new_context()
+        except Exception:
+            # Navegador caído: start() lo relanzará en la próxima petición y quien
+            # espere en la cola vieja fallará rápido con el contexto cerrado
+            return context
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._playwright = None
+        self._browser = None
+        self._contexts = None
+
+
+_browser_pool = None
+
+
+def get_browser_pool():
+    # Pool único para todo el proceso
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
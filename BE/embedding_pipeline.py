@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from llama_index.core.schema import TextNode, MetadataMode
+from metrics import span, count
+
+
+def node_to_record(node, name):
+    return {
+        "id": node.node_id,
+        "file": name,
+        "text": node.text,
+        "metadata": node.metadata,
+        "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+        "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+    }
+
+
+def node_from_record(record):
+    return TextNode(
+        id_=record["id"],
+        text=record["text"],
+        metadata=record["metadata"],
+        excluded_embed_metadata_keys=record.get("excluded_embed_metadata_keys", []),
+        excluded_llm_metadata_keys=record.get("excluded_llm_metadata_keys", []),
+    )
+
+
+def is_rate_limit(error):
+    # openai.RateLimitError, errores HTTP con status 429 o mensajes equivalentes
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    text = f"{type(error).__name__} {error}".lower()
+    return status == 429 or "ratelimit" in text or "rate limit" in text or "429" in text
+
+
+class AdaptiveLimiter:
+    # Concurrencia AIMD: baja a la mitad con cada 429 y sube de uno en uno tras varios éxitos
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, ok):
+        with self._condition:
+            self._in_flight -= 1
+            if ok:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def throttle(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+class EmbeddingPipeline:
+    """Embebe los fragmentos de varios archivos por lotes, con concurrencia acotada.
+
+    Cada archivo tiene un checkpoint en ``<checkpoint_path>/<clave>/``: sus
+    fragmentos (``chunks.jsonl``) y un ``seg_*.npz`` por lote terminado. Si la
+    construcción se interrumpe, la siguiente reutiliza los fragmentos (mismos ids)
+    y solo embebe lo que faltaba.
+    """
+
+    def __init__(self, embed_model, checkpoint_path, model_id,
+                 batch_size=None, concurrency=None, max_retries=None, backoff=None):
+        self.embed_model = embed_model
+        self.checkpoint_path = checkpoint_path
+        self.model_id = model_id
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        self.concurrency = concurrency or int(os.getenv("EMBED_CONCURRENCY", "4"))
+        self.max_retries = max_retries or int(os.getenv("EMBED_MAX_RETRIES", "6"))
+        self.backoff = backoff or float(os.getenv("EMBED_RETRY_BACKOFF", "1"))
+        self.limiter = AdaptiveLimiter(self.concurrency)
+        self.rate_limited = 0
+        self.embedded = 0
+        self.resumed = 0
+
+    def _checkpoint_dir(self, digest):
+        key = hashlib.sha256(f"{self.model_id}\0{digest}".encode()).hexdigest()[:24]
+        return os.path.join(self.checkpoint_path, key)
+
+    def _load_or_chunk(self, name, digest, chunk_file):
+        path = self._checkpoint_dir(digest)
+        chunks_path = os.path.join(path, "chunks.jsonl")
+        if os.path.exists(chunks_path):
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                nodes = [node_from_record(json.loads(line)) for line in f]
+        else:
+            nodes = chunk_file(name)
+            os.makedirs(path, exist_ok=True)
+            tmp_path = f"{chunks_path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for node in nodes:
+                    f.write(json.dumps(node_to_record(node, name), ensure_ascii=False) + "\n")
+            os.replace(tmp_path, chunks_path)
+
+        vectors = [None] * len(nodes)
+        for segment in sorted(os.listdir(path)):
+            if segment.startswith("seg_") and segment.endswith(".npz"):
+                data = np.load(os.path.join(path, segment))
+                for index, vector in zip(data["indices"], data["vectors"]):
+                    vectors[int(index)] = vector
+                    self.resumed += 1
+        return path, nodes, vectors
+
+    def _embed_batch(self, texts):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with span("embed_batch"):
+                    result = self.embed_model.get_text_embedding_batch(texts)
+            except Exception as e:
+                self.limiter.release(False)
+                if not is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                count("embed_rate_limited_total")
+                self.limiter.throttle()
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                print(f"Límite de tasa en embeddings, reintentando en {delay:.1f}s "
+                      f"(concurrencia {self.limiter.limit})")
+                time.sleep(delay)
+                continue
+            self.limiter.release(True)
+            return result
+
+    def _save_segment(self, items, vectors):
+        # Un segmento por archivo presente en el lote terminado
+        by_path = {}
+        for (path, index), vector in zip(items, vectors):
+            by_path.setdefault(path, ([], []))
+            by_path[path][0].append(index)
+            by_path[path][1].append(vector)
+        for path, (indices, file_vectors) in by_path.items():
+            segment = os.path.join(path, f"seg_{time.time_ns()}_{threading.get_ident()}.npz")
+            tmp_path = f"{segment}.tmp.npz"
+            np.savez(tmp_path, indices=np.asarray(indices, dtype=np.int64),
+                     vectors=np.asarray(file_vectors, dtype=np.float32))
+            os.replace(tmp_path, segment)
+
+    def run(self, files, chunk_file):
+        """files: lista de (nombre, hash); chunk_file(nombre) -> lista de TextNode.
+
+        Devuelve {nombre: [(nodo, vector), ...]} con todos los fragmentos embebidos.
+        """
+        state = {}
+        pending_batch = []
+        in_flight = {}
+
+        def collect(done):
+            for future in done:
+                items = in_flight.pop(future)
+                batch_vectors = future.result()
+                self._save_segment([(state_path, index) for state_path, _, index in items], batch_vectors)
+                for (_, vectors, index), vector in zip(items, batch_vectors):
+                    vectors[index] = vector
+                self.embedded += len(items)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            def submit(batch):
+                future = pool.submit(self._embed_batch, [text for _, _, _, text in batch])
+                in_flight[future] = [(path, vectors, index) for path, vectors, index, _ in batch]
+                # Como mucho dos lotes por hilo en vuelo: memoria acotada aunque la carpeta sea enorme
+                while len(in_flight) >= self.concurrency * 2:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            # Los archivos se leen y trocean de uno en uno mientras los lotes anteriores se embeben
+            for name, digest in files:
+                path, nodes, vectors = self._load_or_chunk(name, digest, chunk_file)
+                state[name] = (path, nodes, vectors)
+                for index, node in enumerate(nodes):
+                    if vectors[index] is None:
+                        text = node.get_content(metadata_mode=MetadataMode.EMBED)
+                        pending_batch.append((path, vectors, index, text))
+                        if len(pending_batch) >= self.batch_size:
+                            submit(pending_batch)
+                            pending_batch = []
+            if pending_batch:
+                submit(pending_batch)
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                collect(done)
+
+        return {name: list(zip(nodes, vectors)) for name, (_, nodes, vectors) in state.items()}
+
+    def clear(self, files):
+        # Tras publicar la versión los checkpoints ya no hacen falta
+        for _, digest in files:
+            shutil.rmtree(self._checkpoint_dir(digest), ignore_errors=True)
+        try:
+            os.rmdir(self.checkpoint_path)
+        except OSError:
+            # No existe o quedan checkpoints de otros archivos
+            pass
+
+    def stats(self):
+        return {"embedded": self.embedded, "resumed": self.resumed, "rate_limited": self.rate_limited,
+                "concurrency": self.limiter.limit, "batch_size": self.batch_size}
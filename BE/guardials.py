@@ -1,21 +1,45 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
+import asyncio
 from dotenv import load_dotenv
-from nemoguardrails import RailsConfig, LLMRails
 import re
+import json
+from rails_cache import RailsCache, rails_config_version
+from passage_selector import select_passages
+from metrics import instrument_app, span, count
+from segment_store import get_folder_store, folder_in_use
+from warmup import components
 
 # Load environment variables from .env
 load_dotenv()
 
-# Configure Guardrails
-config = RailsConfig.from_path("./config")
-rails = LLMRails(config)
+# Rails config folder, resolved at import: the rails are built lazily and the working
+# directory may have changed by then (benchmarks chdir into a temporary folder)
+CONFIG_PATH = os.path.abspath("./config")
+
+# Cache of rails outputs, invalidated automatically when the config changes
+rails_cache = RailsCache(config_version=rails_config_version(CONFIG_PATH))
 
 # Initialize FastAPI application
 app = FastAPI()
 
+# Per-route and per-stage latency on /metrics (optional sampling profiler via PROFILE_REQUESTS)
+instrument_app(app, "guardials")
+
+
+def load_rails():
+    # nemoguardrails and the rails config are loaded on the first rails call, not at import
+    from nemoguardrails import RailsConfig, LLMRails
+    return LLMRails(RailsConfig.from_path(CONFIG_PATH))
+
+
+components.register("rails", load_rails)
+# /ready and optional background preload (WARMUP=rails)
+components.install(app)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +56,10 @@ class UUIDRequest(BaseModel):
 # Character limit per file
 CHARACTER_LIMIT = 4000
 
+# How the CHARACTER_LIMIT budget is filled: "bm25" ranks paragraphs by hotel relevance,
+# "truncate" keeps the first CHARACTER_LIMIT characters
+PASSAGE_SELECTION = os.getenv("PASSAGE_SELECTION", "bm25")
+
 # Function to clean URLs and specific headers
 def clean_content(text):
     # Remove lines containing URLs or any "URL:" header
@@ -39,6 +67,69 @@ def clean_content(text):
     text = re.sub(r'http[s]?://\S+', '', text)  # Remove actual URLs
     return text.strip()  # Remove extra whitespace
 
+# Concurrency, timeout and retry policy for the per-file rails calls
+RAILS_CONCURRENCY = int(os.getenv("RAILS_CONCURRENCY", "5"))
+RAILS_TIMEOUT = float(os.getenv("RAILS_TIMEOUT", "60"))
+RAILS_RETRIES = int(os.getenv("RAILS_RETRIES", "2"))
+RAILS_RETRY_BACKOFF = float(os.getenv("RAILS_RETRY_BACKOFF", "1"))
+
+# Shared by all requests so concurrent calls never exceed RAILS_CONCURRENCY in total
+rails_semaphore = asyncio.Semaphore(RAILS_CONCURRENCY)
+
+async def generate_with_retries(content):
+    # Call the rails with a per-attempt timeout, backing off exponentially between attempts
+    rails = await components.get("rails")
+    for attempt in range(RAILS_RETRIES + 1):
+        try:
+            async with rails_semaphore:
+                with span("rails_call"):
+                    return await asyncio.wait_for(
+                        rails.generate_async(messages=[{"role": "user", "content": content}]),
+                        timeout=RAILS_TIMEOUT,
+                    )
+        except Exception as e:
+            if attempt == RAILS_RETRIES:
+                raise
+            print(f"Rails call failed ({type(e).__name__}: {e}), retrying ({attempt + 1}/{RAILS_RETRIES})")
+            await asyncio.sleep(RAILS_RETRY_BACKOFF * 2 ** attempt)
+
+async def process_file(folder_path, filename):
+    # Returns a response entry, or an error entry instead of raising
+    file_path = os.path.join(folder_path, filename)
+    try:
+        # Read each .txt page from the folder's compressed segment
+        content = await asyncio.to_thread(get_folder_store(folder_path).get, filename)
+    except Exception as e:
+        print(f"Error reading {file_path}: {str(e)}")
+        return {"filename": filename, "error": f"Error reading {file_path}"}
+
+    # Clean the content to remove URLs
+    content = clean_content(content)
+
+    # Limit content to 4000 characters, keeping the most hotel-relevant paragraphs
+    if PASSAGE_SELECTION == "bm25":
+        with span("passage_selection"):
+            truncated_content = select_passages(content, CHARACTER_LIMIT)
+    else:
+        truncated_content = content[:CHARACTER_LIMIT]
+
+    # Identical content (in any folder) was already processed: skip the LLM
+    cache_key = rails_cache.key(truncated_content)
+    cached = await asyncio.to_thread(rails_cache.get, cache_key)
+    count("rails_cache_lookups_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return {"filename": filename, "response": cached, "cached": True}
+
+    try:
+        # Send content to Guardrails for processing
+        response = await generate_with_retries(truncated_content)
+    except Exception as e:
+        print(f"Error processing {file_path}: {type(e).__name__}: {e}")
+        return {"filename": filename, "error": f"{type(e).__name__}: {e}"}
+
+    await asyncio.to_thread(rails_cache.put, cache_key, response["content"])
+    return {"filename": filename, "response": response["content"], "cached": False}
+
 # Endpoint to process each file in the UUID folder individually
 @app.post("/generate_hotel_info/")
 async def generate_hotel_info(request: UUIDRequest):
@@ -49,38 +140,40 @@ async def generate_hotel_info(request: UUIDRequest):
     if not os.path.exists(folder_path):
         raise HTTPException(status_code=404, detail="Folder not found")
 
-    # Initialize a list to store responses for each file
-    file_responses = []
-
-    # Iterate through all .txt files in the folder
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                # Read and clean content of each .txt file
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                    # Clean the content to remove URLs
-                    content = clean_content(content)
-                    
-                    # Limit content to 4000 characters
-                    truncated_content = content[:CHARACTER_LIMIT]
-
-                    # Send content to Guardrails for processing
-                    response = await rails.generate_async(messages=[{
-                        "role": "user",
-                        "content": truncated_content
-                    }])
-
-                    # Append the response for this file to the results
-                    file_responses.append({
-                        "filename": filename,
-                        "response": response["content"]
-                    })
-                    
-            except Exception as e:
-                print(f"Error reading {file_path}: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Error reading {file_path}")
+    # Fan out one rails call per .txt file; a failed file becomes an error entry.
+    # The folder is marked in use so the api's store collector leaves it alone
+    with folder_in_use(folder_path):
+        filenames = await asyncio.to_thread(lambda: get_folder_store(folder_path).names((".txt",)))
+        file_responses = await asyncio.gather(*(process_file(folder_path, filename) for filename in filenames))
 
     # Return all responses as a list of results, one for each file
-    return {"responses": file_responses}
\ No newline at end of file
+    return {"responses": file_responses}
+
+# Streaming variant: one NDJSON line per file as soon as its rails call finishes
+@app.post("/generate_hotel_info_stream/")
+async def generate_hotel_info_stream(request: UUIDRequest):
+    folder_path = os.path.join("data", request.uuid)
+    if not os.path.exists(folder_path):
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    filenames = await asyncio.to_thread(lambda: get_folder_store(folder_path).names((".txt",)))
+
+    async def events():
+        tasks = [asyncio.ensure_future(process_file(folder_path, filename)) for filename in filenames]
+        try:
+            with folder_in_use(folder_path):
+                for next_done in asyncio.as_completed(tasks):
+                    yield json.dumps({"event": "result", **(await next_done)}) + "\n"
+            yield json.dumps({"event": "done", "count": len(tasks)}) + "\n"
+        finally:
+            # Stop pending rails calls if the client disconnects
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# Hit rate and size of the rails output cache
+@app.get("/rails_cache_stats/")
+async def rails_cache_stats():
+    return await asyncio.to_thread(rails_cache.stats)
@@ -0,0 +1,403 @@
+import os
+import json
+import mmap
+import shutil
+import hashlib
+import mimetypes
+import threading
+from datetime import datetime
+import numpy as np
+from llama_index.core import Document, Settings
+from llama_index.core.schema import MetadataMode, TextNode, NodeRelationship
+from llama_index.core.indices.keyword_table.utils import simple_extract_keywords
+from ann_index import IVFIndex
+from keyword_table import KeywordTable
+from embedding_pipeline import EmbeddingPipeline, node_to_record, node_from_record
+from text_chunker import split_chunks
+from segment_store import get_folder_store, path_lock
+from metrics import span
+
+INDEX_DIR = ".index"
+# Checkpoints de las construcciones en curso (fragmentos y lotes ya embebidos)
+PENDING_DIR = "pending"
+# 2: tabla de palabras clave en arrays con mmap (la 1 la guardaba en keywords.json)
+FORMAT_VERSION = 2
+# Archivos de la carpeta que entran en el índice (páginas scrapeadas y location_data.json)
+INDEXED_EXTENSIONS = (".txt", ".json")
+# Igual que SimpleKeywordTableIndex por defecto
+MAX_KEYWORDS_PER_CHUNK = 10
+# A partir de cuántos nodos se construye el índice aproximado (IVF) y cuántas listas se exploran
+ANN_MIN_NODES = int(os.getenv("ANN_MIN_NODES", "2000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+# Las actualizaciones incrementales reparten las filas nuevas entre los centroides ya
+# entrenados; se reentrena si la carpeta creció ANN_RETRAIN_GROWTH veces desde el último
+# entrenamiento o si las filas nuevas quedan ANN_RETRAIN_DRIFT más lejos de su centroide
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "2"))
+ANN_RETRAIN_DRIFT = float(os.getenv("ANN_RETRAIN_DRIFT", "0.05"))
+
+
+def _folder_lock(folder_path):
+    # Entre hilos y entre workers: uno embebe y escribe la versión, los demás esperan y la reutilizan.
+    # Archivo propio (no .store/LOCK) para no frenar las lecturas del almacén mientras se embebe
+    index_path = os.path.join(folder_path, INDEX_DIR)
+    os.makedirs(index_path, exist_ok=True)
+    return path_lock(os.path.join(index_path, "LOCK"))
+
+
+def list_indexed_files(folder_path):
+    return get_folder_store(folder_path).names(INDEXED_EXTENSIONS)
+
+
+def embed_model_id(embed_model):
+    return f"{type(embed_model).__name__}:{getattr(embed_model, 'model_name', '')}"
+
+
+class FolderIndexStore:
+    """Índice en disco de una carpeta, indexado por el hash de contenido de cada archivo.
+
+    Cada versión vive en ``.index/<version>/`` y ``.index/CURRENT`` apunta a la
+    activa, así que un lector nunca ve una versión a medio escribir:
+
+    - ``manifest.json``: hash y rango de filas de cada archivo.
+    - ``vectors.npy``: embeddings normalizados (float32), abiertos con mmap.
+    - ``nodes.jsonl`` + ``offsets.npy``: texto y metadatos de cada nodo, leídos bajo demanda.
+    - ``keyword_*``: tabla palabra clave -> filas (ver KeywordTable), también por mmap.
+    - ``ivf_*.npy``: índice aproximado, solo en carpetas con ANN_MIN_NODES nodos o más.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.index_path = os.path.join(folder_path, INDEX_DIR)
+        self.manifest = None
+        self.vectors = None
+        self.ann = None
+        self._offsets = None
+        self._nodes_file = None
+        self._nodes_map = None
+        self._keywords_file = None
+        self._keywords = None
+        self._keywords_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.manifest["version"] if self.manifest else None
+
+    @property
+    def size_bytes(self):
+        # Tamaño aproximado del índice abierto (vectores + textos de los nodos)
+        if not self.num_nodes:
+            return 0
+        return int(self.vectors.nbytes) + int(self._offsets[-1])
+
+    @property
+    def num_nodes(self):
+        return self.manifest["rows"] if self.manifest else 0
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.index_path, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _read_manifest(self, version):
+        with open(os.path.join(self.index_path, version, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def open(self):
+        with span("index_open"):
+            return self._open()
+
+    def _open(self):
+        # Abre la versión activa sin cargarla en memoria: vectores y nodos van por mmap
+        self.close()
+        for _ in range(3):
+            version = self._current_version()
+            if version is None:
+                return self
+            try:
+                return self._open_version(version)
+            except FileNotFoundError:
+                # Otro proceso acaba de publicar una versión nueva y borró esta (el manifiesto
+                # o cualquiera de sus arrays): se vuelve a leer CURRENT
+                self.close()
+        raise RuntimeError(f"No se pudo abrir el índice de {self.folder_path}")
+
+    def _open_version(self, version):
+        self.manifest = self._read_manifest(version)
+        version_path = os.path.join(self.index_path, version)
+        if self.manifest["rows"]:
+            self.vectors = np.load(os.path.join(version_path, "vectors.npy"), mmap_mode="r")
+            self._offsets = np.load(os.path.join(version_path, "offsets.npy"), mmap_mode="r")
+            self._nodes_file = open(os.path.join(version_path, "nodes.jsonl"), "rb")
+            self._nodes_map = mmap.mmap(self._nodes_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if KeywordTable.exists(version_path):
+                self._keywords = KeywordTable.load(version_path)
+            else:
+                # Formato 1: se abre ya para que siga legible aunque otra versión reemplace a esta
+                self._keywords_file = open(os.path.join(version_path, "keywords.json"), "rb")
+            if self.manifest.get("ann") == "ivf":
+                self.ann = IVFIndex.load(version_path)
+        else:
+            self.vectors = np.zeros((0, self.manifest.get("dim") or 0), dtype=np.float32)
+        return self
+
+    def close(self):
+        if self._nodes_map is not None:
+            self._nodes_map.close()
+        if self._nodes_file is not None:
+            self._nodes_file.close()
+        if self._keywords_file is not None:
+            self._keywords_file.close()
+        if isinstance(self._keywords, KeywordTable):
+            self._keywords.close()
+        self.manifest = None
+        self.vectors = None
+        self.ann = None
+        self._offsets = None
+        self._nodes_file = None
+        self._nodes_map = None
+        self._keywords_file = None
+        self._keywords = None
+
+    def _raw_record(self, row):
+        return bytes(self._nodes_map[int(self._offsets[row]):int(self._offsets[row + 1])])
+
+    def search(self, query, top_k):
+        # Filas más similares a la consulta: IVF si la carpeta es grande, búsqueda exacta si no
+        if not self.num_nodes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if self.ann is not None:
+            return self.ann.search(self.vectors, query, top_k, nprobe=ANN_NPROBE)
+        # Los vectores guardados ya están normalizados: similitud coseno = producto punto
+        scores = self.vectors @ query
+        top_k = min(top_k, len(scores))
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def get_node(self, row):
+        return node_from_record(json.loads(self._raw_record(row)))
+
+    @property
+    def keywords(self):
+        # KeywordTable por mmap; en índices del formato 1 el JSON solo se lee si alguien lo consulta
+        with self._keywords_lock:
+            if self._keywords is None:
+                if not self.num_nodes:
+                    self._keywords = {}
+                else:
+                    self._keywords_file.seek(0)
+                    self._keywords = json.load(self._keywords_file)
+            return self._keywords
+
+    def update(self):
+        # Embebe solo los archivos nuevos o modificados y descarta los eliminados
+        with _folder_lock(self.folder_path), span("index_update"):
+            self.open()
+            model_id = embed_model_id(Settings.embed_model)
+            old_files = self.manifest["files"] if self.manifest else {}
+            if self.manifest and self.manifest.get("embed_model") != model_id:
+                # Otro modelo de embeddings: los vectores viejos no son comparables
+                old_files = {}
+
+            # El índice del segmento ya trae tamaño, fecha y hash de cada página: no se lee ninguna
+            store = get_folder_store(self.folder_path)
+            current, stats = {}, {}
+            for name in list_indexed_files(self.folder_path):
+                entry = store.stat(name)
+                if entry is None:
+                    continue
+                stats[name] = (entry["size"], entry["mtime_ns"])
+                current[name] = entry["sha256"]
+            kept = [name for name, digest in current.items()
+                    if name in old_files and old_files[name]["hash"] == digest]
+            changed = [name for name in current if name not in kept]
+            removed = [name for name in old_files if name not in current]
+
+            if self.manifest and not changed and not removed and self.manifest.get("format") == FORMAT_VERSION:
+                return self
+
+            print(f"Índice {self.folder_path}: {len(kept)} sin cambios, "
+                  f"{len(changed)} para embeber, {len(removed)} eliminados")
+            pending = [(name, current[name]) for name in changed]
+            pipeline = EmbeddingPipeline(Settings.embed_model, os.path.join(self.index_path, PENDING_DIR), model_id)
+            embedded = pipeline.run(pending, self._chunk_file)
+            if changed:
+                print(f"Índice {self.folder_path}: embeddings {pipeline.stats()}")
+            with span("index_write"):
+                self._write_version(current, stats, kept, embedded, model_id)
+            pipeline.clear(pending)
+            return self.open()
+
+    def _chunk_file(self, name):
+        with span("index_chunk"):
+            return self._chunk_documents(name)
+
+    def _chunk_documents(self, name):
+        documents = [self._load_document(name)]
+        nodes, unchunked = [], []
+        for document in documents:
+            chunks = split_chunks(document.text)
+            if chunks is None:
+                unchunked.append(document)
+                continue
+            # El scraper ya lo dejó troceado: cada fragmento es un nodo, sin volver a partirlo
+            for chunk in chunks:
+                node = TextNode(
+                    text=chunk,
+                    metadata=dict(document.metadata),
+                    excluded_embed_metadata_keys=list(document.excluded_embed_metadata_keys),
+                    excluded_llm_metadata_keys=list(document.excluded_llm_metadata_keys),
+                )
+                node.relationships[NodeRelationship.SOURCE] = document.as_related_node_info()
+                nodes.append(node)
+        if unchunked:
+            nodes.extend(Settings.node_parser.get_nodes_from_documents(unchunked))
+        return nodes
+
+    def _load_document(self, name):
+        # Mismos metadatos que ponía SimpleDirectoryReader, para que los nodos no cambien
+        store = get_folder_store(self.folder_path)
+        text = store.get(name)
+        entry = store.stat(name)
+        modified = datetime.fromtimestamp(entry["mtime_ns"] / 1e9).strftime("%Y-%m-%d")
+        excluded = ["file_name", "file_type", "file_size", "creation_date", "last_modified_date", "last_accessed_date"]
+        return Document(
+            text=text,
+            metadata={
+                "file_path": os.path.join(self.folder_path, name),
+                "file_name": name,
+                "file_type": mimetypes.guess_type(name)[0],
+                "file_size": entry["size"],
+                "creation_date": modified,
+                "last_modified_date": modified,
+            },
+            excluded_embed_metadata_keys=excluded,
+            excluded_llm_metadata_keys=list(excluded),
+        )
+
+    def _write_version(self, current, stats, kept, embedded, model_id):
+        # Cada versión es un directorio inmutable (los lectores la tienen abierta por mmap):
+        # las filas que no cambian se copian en bloque y solo las nuevas se procesan fila a fila
+        files = {}
+        old_files = self.manifest["files"] if kept else {}
+        remap = np.full(self.num_nodes if kept else 0, -1, dtype=np.int64)
+        ranges = []  # (inicio viejo, fin viejo, inicio nuevo) de cada archivo que sigue
+        rows = 0
+        for name in sorted(kept, key=lambda name: old_files[name]["start"]):
+            start, end = old_files[name]["start"], old_files[name]["end"]
+            files[name] = {"hash": current[name], "start": rows, "end": rows + end - start}
+            if end > start:
+                remap[start:end] = np.arange(rows, rows + end - start)
+                ranges.append((start, end, rows))
+            rows += end - start
+        kept_rows = rows
+
+        # Filas nuevas, ya agrupadas por archivo
+        records, vectors, keyword_rows = [], [], []
+        for name, items in embedded.items():
+            if not items:
+                continue
+            files[name] = {"hash": current[name], "start": rows, "end": rows + len(items)}
+            rows += len(items)
+            for node, embedding in items:
+                records.append(json.dumps(node_to_record(node, name), ensure_ascii=False).encode("utf-8") + b"\n")
+                vector = np.asarray(embedding, dtype=np.float32)
+                vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+                keyword_rows.append(simple_extract_keywords(
+                    node.get_content(metadata_mode=MetadataMode.LLM), MAX_KEYWORDS_PER_CHUNK))
+        # Archivos sin texto extraíble siguen en el manifiesto para no reprocesarlos
+        for name in current:
+            files.setdefault(name, {"hash": current[name], "start": rows, "end": rows})
+
+        for name, meta in files.items():
+            meta["size"], meta["mtime_ns"] = stats[name]
+
+        dim = vectors[0].shape[0] if vectors else (self.manifest or {}).get("dim", 0)
+        version = hashlib.sha256(json.dumps(
+            [FORMAT_VERSION, model_id, sorted((name, meta["hash"]) for name, meta in files.items())]
+        ).encode()).hexdigest()[:16]
+
+        version_path = os.path.join(self.index_path, version)
+        tmp_path = f"{version_path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        if rows:
+            # Se escribe directamente en el .npy de destino: ni lista de filas ni vstack de todo
+            matrix = np.lib.format.open_memmap(os.path.join(tmp_path, "vectors.npy"), mode="w+",
+                                               dtype=np.float32, shape=(rows, dim))
+            for start, end, new_start in ranges:
+                matrix[new_start:new_start + end - start] = self.vectors[start:end]
+            if vectors:
+                matrix[kept_rows:] = np.vstack(vectors)
+            matrix.flush()
+        else:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+            np.save(os.path.join(tmp_path, "vectors.npy"), matrix)
+
+        offsets = np.zeros(rows + 1, dtype=np.int64)
+        with open(os.path.join(tmp_path, "nodes.jsonl"), "wb") as f:
+            if ranges:
+                with memoryview(self._nodes_map) as nodes:
+                    for start, end, new_start in ranges:
+                        f.write(nodes[int(self._offsets[start]):int(self._offsets[end])])
+                        offsets[new_start + 1:new_start + 1 + end - start] = (
+                            self._offsets[start + 1:end + 1] - self._offsets[start] + offsets[new_start])
+            for row, record in enumerate(records, start=kept_rows):
+                f.write(record)
+                offsets[row + 1] = offsets[row] + len(record)
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+
+        if kept_rows:
+            KeywordTable.merge(self._keyword_table(), remap, keyword_rows, kept_rows).save(tmp_path)
+        else:
+            KeywordTable.build(keyword_rows).save(tmp_path)
+
+        manifest = {"format": FORMAT_VERSION, "version": version, "embed_model": model_id,
+                    "dim": int(dim), "rows": rows, "files": files}
+        if rows >= ANN_MIN_NODES:
+            ann, trained_rows = self._ivf_for(matrix, remap, kept_rows)
+            ann.save(tmp_path)
+            manifest.update(ann="ivf", ann_trained_rows=trained_rows, ann_fit=ann.fit)
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        del matrix
+
+        if os.path.exists(version_path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.replace(tmp_path, version_path)
+        self._set_current(version)
+
+    def _ivf_for(self, matrix, remap, kept_rows):
+        # IVF de la versión nueva: el anterior ampliado con las filas nuevas, o reentrenado
+        # si no hay, si la carpeta creció demasiado o si las filas nuevas no encajan
+        # en sus listas. Devuelve (índice, filas con las que se entrenó)
+        trained_rows = (self.manifest or {}).get("ann_trained_rows")
+        fit = (self.manifest or {}).get("ann_fit")
+        if (self.ann is not None and kept_rows and trained_rows and fit is not None
+                and len(matrix) <= trained_rows * ANN_RETRAIN_GROWTH):
+            self.ann.fit = fit
+            ann, added_fit = self.ann.extend(remap, matrix, kept_rows)
+            if added_fit is None or added_fit >= fit - ANN_RETRAIN_DRIFT:
+                return ann, trained_rows
+        with span("ivf_train"):
+            return IVFIndex.build(matrix), len(matrix)
+
+    def _keyword_table(self):
+        # Tabla de la versión abierta; la del formato 1 (dict) se convierte una vez
+        keywords = self.keywords
+        return keywords if isinstance(keywords, KeywordTable) else KeywordTable.from_mapping(keywords)
+
+    def _set_current(self, version):
+        previous = self._current_version()
+        tmp_current = os.path.join(self.index_path, f"CURRENT.tmp-{os.getpid()}")
+        with open(tmp_current, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_current, os.path.join(self.index_path, "CURRENT"))
+        # Los lectores que aún tengan la versión anterior abierta conservan su mmap
+        if previous and previous != version:
+            shutil.rmtree(os.path.join(self.index_path, previous), ignore_errors=True)
@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import threading
+
+# Estados terminales: quien esté suscrito deja de esperar eventos
+FINISHED = ("done", "failed")
+# Cada worker renueva su lease cada JOB_HEARTBEAT segundos; un trabajo 'running' cuyo
+# lease lleva más de JOB_LEASE segundos sin renovarse (o cuyo proceso ya no existe) vuelve a la cola
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "10"))
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))
+# Los eventos de otros procesos no llegan por la cola local: quien sigue un trabajo
+# relee SQLite si pasan JOB_SUBSCRIBE_POLL segundos sin eventos en vivo
+JOB_SUBSCRIBE_POLL = float(os.getenv("JOB_SUBSCRIBE_POLL", "1"))
+# Dueño por defecto de _finish: este proceso (None es un dueño válido, el de bases antiguas)
+_SELF = object()
+
+
+def _owner_alive(owner):
+    # owner = "host:pid:nonce"; solo se puede comprobar el pid si es de esta máquina
+    try:
+        host, pid, _ = owner.rsplit(":", 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    if host != socket.gethostname() or os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """Cola persistente de trabajos en segundo plano (scraping + indexado).
+
+    Los trabajos y su progreso viven en SQLite, así que un reinicio no los pierde.
+    Varios procesos (workers de uvicorn) pueden compartir la misma base: cada
+    trabajo en marcha tiene dueño (``owner``) y un lease que el dueño renueva;
+    solo vuelven a la cola los trabajos cuyo dueño murió o cuyo lease caducó.
+    Cada trabajo emite eventos numerados que se pueden consultar (``events``) o
+    seguir en vivo (``subscribe``). Los workers toman primero los de mayor prioridad.
+    """
+
+    def __init__(self, path=None, workers=None, max_attempts=None):
+        self.path = path or os.getenv("JOB_DB_PATH", os.path.join("cache", "jobs.sqlite3"))
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self._handlers = {}
+        self._subscribers = {}
+        self._tasks = []
+        self._wakeup = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL, owner TEXT, heartbeat REAL)"
+        )
+        # Bases creadas antes de los leases
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs(status, priority, created)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            "job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+        )
+        self._db.commit()
+
+    def register(self, kind, handler):
+        # handler(job, report) es una corrutina; report(evento) publica el progreso
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, priority=0):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, priority, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), priority, time.time()),
+            )
+            self._db.commit()
+        self._emit(job_id, {"event": "queued", "priority": priority})
+        if self._loop is not None:
+            # submit puede llamarse desde otro hilo (asyncio.to_thread)
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, priority, status, attempts, result, error, created, started, finished "
+                "FROM jobs WHERE id = ?", (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row[4] == "queued":
+                # Cuántos trabajos saldrán antes que este
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    "(priority > ? OR (priority = ? AND created < ?))", (row[3], row[3], row[8]),
+                ).fetchone()[0]
+        return {
+            "job_id": row[0], "kind": row[1], "payload": json.loads(row[2]), "priority": row[3],
+            "status": row[4], "attempts": row[5], "result": json.loads(row[6]) if row[6] else None,
+            "error": row[7], "created": row[8], "started": row[9], "finished": row[10],
+            "queue_position": position,
+        }
+
+    def events(self, job_id, after=0):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def subscribe(self, job_id, after=0):
+        # Primero el historial guardado y luego los eventos en vivo hasta que el trabajo termine
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            last = after
+            for event in await asyncio.to_thread(self.events, job_id, after):
+                last = event["seq"]
+                yield event
+                if event["event"] in FINISHED:
+                    return
+            closing = False
+            while True:
+                try:
+                    events = [await asyncio.wait_for(queue.get(), JOB_SUBSCRIBE_POLL)]
+                except asyncio.TimeoutError:
+                    # Puede que el trabajo lo esté ejecutando otro proceso: se mira el estado
+                    # antes de releer. _finish guarda el estado antes que su evento, así que
+                    # un trabajo terminado sin evento nuevo se espera una vuelta más
+                    job = await asyncio.to_thread(self.get, job_id)
+                    events = await asyncio.to_thread(self.events, job_id, last)
+                    if job is None or (job["status"] in FINISHED and not events and closing):
+                        return
+                    closing = job["status"] in FINISHED
+                for event in events:
+                    if event["seq"] <= last:
+                        continue
+                    last = event["seq"]
+                    yield event
+                    if event["event"] in FINISHED:
+                        return
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def _emit(self, job_id, event):
+        with self._lock:
+            seq = self._db.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,),
+            ).fetchone()[0]
+            event = {"seq": seq, "time": time.time(), **event}
+            self._db.execute("INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                             (job_id, seq, json.dumps(event, ensure_ascii=False)))
+            self._db.commit()
+        for queue in list(self._subscribers.get(job_id, ())):
+            self._loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _claim(self):
+        while True:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                # Solo si sigue en cola: otro proceso pudo tomarlo entre el SELECT y el UPDATE
+                now = time.time()
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ?, owner = ?, "
+                    "heartbeat = ? WHERE id = ? AND status = 'queued'", (now, self.owner, now, row[0]),
+                ).rowcount
+                self._db.commit()
+            if claimed:
+                return self.get(row[0])
+
+    def _finish(self, job_id, status, result=None, error=None, owner=_SELF):
+        # Solo el dueño actual cierra el trabajo: si su lease caducó y otro lo retomó, no se pisa
+        with self._lock:
+            finished = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, owner = NULL "
+                "WHERE id = ? AND status = 'running' AND owner IS ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id, self.owner if owner is _SELF else owner),
+            ).rowcount
+            self._db.commit()
+        if finished:
+            self._emit(job_id, {"event": status, "result": result, "error": error})
+        return bool(finished)
+
+    def _requeue(self, job_id, owner, attempts):
+        with self._lock:
+            requeued = self._db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, heartbeat = NULL "
+                "WHERE id = ? AND status = 'running' AND owner IS ?", (job_id, owner),
+            ).rowcount
+            self._db.commit()
+        if requeued:
+            self._emit(job_id, {"event": "requeued", "attempts": attempts})
+        return bool(requeued)
+
+    def _heartbeat(self):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                             (time.time(), self.owner))
+            self._db.commit()
+
+    def _recover(self):
+        # Trabajos en marcha cuyo dueño murió o dejó de renovar el lease: vuelven a la cola,
+        # salvo los que ya fallaron demasiadas veces (probablemente tumban el worker).
+        # Los de procesos hermanos vivos no se tocan
+        expired = time.time() - JOB_LEASE
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, attempts, owner, heartbeat FROM jobs WHERE status = 'running' AND owner IS NOT ?",
+                (self.owner,),
+            ).fetchall()
+        recovered = 0
+        for job_id, attempts, owner, heartbeat in rows:
+            if owner is not None and (heartbeat or 0) >= expired and _owner_alive(owner):
+                continue
+            if attempts >= self.max_attempts:
+                recovered += self._finish(job_id, "failed", error=f"Interrumpido {attempts} veces", owner=owner)
+            else:
+                recovered += self._requeue(job_id, owner, attempts)
+        if recovered:
+            print(f"Cola de trabajos: {recovered} trabajos interrumpidos recuperados")
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _release(self):
+        # Al apagar: los trabajos en curso de este proceso vuelven a la cola para otro worker
+        with self._lock:
+            rows = self._db.execute("SELECT id, attempts FROM jobs WHERE status = 'running' AND owner = ?",
+                                    (self.owner,)).fetchall()
+        for job_id, attempts in rows:
+            self._requeue(job_id, self.owner, attempts)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self._recover)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_alive()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._release)
+
+    async def _keep_alive(self):
+        # Renueva los leases propios y recupera los de procesos que murieron
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT)
+            try:
+                await asyncio.to_thread(self._heartbeat)
+                await asyncio.to_thread(self._recover)
+            except sqlite3.Error as e:
+                print(f"Cola de trabajos: error renovando leases: {e}")
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        job_id = job["job_id"]
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(self._finish, job_id, "failed", error=f"Tipo de trabajo desconocido: {job['kind']}")
+            return
+        await asyncio.to_thread(self._emit, job_id, {"event": "started", "attempt": job["attempts"]})
+        # report() no bloquea el event loop: los eventos se escriben en orden desde un hilo
+        pending = asyncio.Queue()
+        writer = asyncio.create_task(self._write_events(job_id, pending))
+        try:
+            result = await handler(job, pending.put_nowait)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Trabajo {job_id} fallido: {e}")
+            status, result, error = "failed", None, str(e)
+        else:
+            status, error = "done", None
+        finally:
+            pending.put_nowait(None)
+            await writer
+        await asyncio.to_thread(self._finish, job_id, status, result, error)
+
+    async def _write_events(self, job_id, pending):
+        while True:
+            event = await pending.get()
+            if event is None:
+                return
+            await asyncio.to_thread(self._emit, job_id, event)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "running_workers": len(self._tasks), "owner": self.owner, "jobs": counts}
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
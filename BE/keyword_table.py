@@ -0,0 +1,120 @@
+import os
+import mmap
+import numpy as np
+
+
+class KeywordTable:
+    """Tabla palabra clave -> filas en arrays planos (CSR) abiertos con mmap.
+
+    - ``keyword_terms.bin`` + ``keyword_term_offsets.npy``: palabras ordenadas, en UTF-8 seguidas.
+    - ``keyword_indptr.npy`` + ``keyword_rows.npy``: filas de la palabra i en ``rows[indptr[i]:indptr[i + 1]]``.
+
+    Abrirla no lee nada: la búsqueda es binaria sobre el mmap, así que varios
+    workers con la misma carpeta comparten las páginas en la caché del sistema
+    en lugar de tener cada uno su propio dict.
+    """
+
+    def __init__(self, terms, term_offsets, indptr, rows):
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.indptr = indptr
+        self.rows = rows
+
+    @classmethod
+    def build(cls, keyword_rows, first_row=0):
+        # keyword_rows: conjunto de palabras clave de cada fila, en orden de fila desde first_row
+        table = {}
+        for row, keywords in enumerate(keyword_rows, start=first_row):
+            for keyword in keywords:
+                table.setdefault(keyword.encode("utf-8"), []).append(row)
+        return cls._from_table(table)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        # Tabla del formato 1 (dict palabra -> filas, como keywords.json)
+        return cls._from_table({keyword.encode("utf-8"): sorted(int(row) for row in rows)
+                                for keyword, rows in mapping.items()})
+
+    @classmethod
+    def merge(cls, table, remap, keyword_rows, first_row):
+        """Tabla de una versión nueva del índice sin recorrer fila a fila la anterior.
+
+        Las filas de ``table`` se renumeran de una vez con ``remap`` (fila vieja ->
+        fila nueva, -1 si se descarta) y se añaden las palabras de las filas
+        nuevas, que empiezan en ``first_row``.
+        """
+        added = cls.build(keyword_rows, first_row)
+        mapped = remap[table.rows] if len(table.rows) else np.zeros(0, dtype=np.int64)
+        keep = mapped >= 0
+        term_ids = np.repeat(np.arange(len(table)), np.diff(table.indptr))[keep]
+        mapped = mapped[keep]
+        bounds = np.searchsorted(term_ids, np.arange(len(table) + 1))
+        merged = {table._term(i): mapped[bounds[i]:bounds[i + 1]]
+                  for i in range(len(table)) if bounds[i] < bounds[i + 1]}
+        for i in range(len(added)):
+            term, rows = added._term(i), added.rows[int(added.indptr[i]):int(added.indptr[i + 1])]
+            # Las filas nuevas van detrás de las que siguen: cada lista queda ordenada
+            merged[term] = np.concatenate([merged[term], rows]) if term in merged else rows
+        return cls._from_table(merged)
+
+    @classmethod
+    def _from_table(cls, table):
+        # table: palabra en UTF-8 -> filas (ordenadas)
+        terms = sorted(table)
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(term) for term in terms])
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(table[term]) for term in terms])
+        rows = (np.concatenate([np.asarray(table[term], dtype=np.int32) for term in terms])
+                if terms else np.zeros(0, dtype=np.int32))
+        return cls(b"".join(terms), term_offsets, indptr, rows.astype(np.int32, copy=False))
+
+    def save(self, path):
+        with open(os.path.join(path, "keyword_terms.bin"), "wb") as f:
+            f.write(self.terms)
+        np.save(os.path.join(path, "keyword_term_offsets.npy"), self.term_offsets)
+        np.save(os.path.join(path, "keyword_indptr.npy"), self.indptr)
+        np.save(os.path.join(path, "keyword_rows.npy"), self.rows)
+
+    @classmethod
+    def load(cls, path):
+        term_offsets, indptr, rows = (np.load(os.path.join(path, f"keyword_{name}.npy"), mmap_mode="r")
+                                      for name in ("term_offsets", "indptr", "rows"))
+        terms = b""
+        if term_offsets[-1]:
+            # mmap no admite archivos vacíos; el archivo se puede cerrar, el mapa sigue válido
+            with open(os.path.join(path, "keyword_terms.bin"), "rb") as f:
+                terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(terms, term_offsets, indptr, rows)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "keyword_indptr.npy"))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def _term(self, i):
+        return self.terms[int(self.term_offsets[i]):int(self.term_offsets[i + 1])]
+
+    def get(self, keyword, default=()):
+        # Búsqueda binaria sobre las palabras ordenadas (mismo orden que bytes en UTF-8)
+        target = keyword.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._term(low) == target:
+            return self.rows[int(self.indptr[low]):int(self.indptr[low + 1])]
+        return default
+
+    def items(self):
+        for i in range(len(self)):
+            yield self._term(i).decode("utf-8"), self.rows[int(self.indptr[i]):int(self.indptr[i + 1])]
+
+    def close(self):
+        if isinstance(self.terms, mmap.mmap):
+            self.terms.close()
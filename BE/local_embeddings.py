@@ -0,0 +1,54 @@
+import os
+from typing import List
+from llama_index.core import Settings
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+
+class LocalEmbedding(BaseEmbedding):
+    """Embeddings calculados en CPU con un modelo pequeño de sentence-transformers.
+
+    No requiere red una vez descargado el modelo; los textos se codifican por lotes.
+    """
+
+    _model = PrivateAttr()
+
+    def __init__(self, model_name="BAAI/bge-small-en-v1.5", embed_batch_size=64, device="cpu", **kwargs):
+        super().__init__(model_name=model_name, embed_batch_size=embed_batch_size, **kwargs)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBED_BACKEND=local requiere sentence-transformers: pip install sentence-transformers"
+            ) from e
+        self._model = SentenceTransformer(model_name, device=device)
+
+    def _encode(self, texts):
+        return self._model.encode(
+            texts, batch_size=self.embed_batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False,
+        ).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._encode([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+
+def configure_embed_model():
+    # EMBED_BACKEND=openai (por defecto, el de LlamaIndex) o local (sin red)
+    backend = os.getenv("EMBED_BACKEND", "openai").lower()
+    if backend == "local":
+        Settings.embed_model = LocalEmbedding(
+            model_name=os.getenv("LOCAL_EMBED_MODEL", "BAAI/bge-small-en-v1.5"),
+            embed_batch_size=int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "64")),
+        )
+    elif backend != "openai":
+        raise ValueError(f"EMBED_BACKEND inválido: {backend}. Usa 'openai' o 'local'")
@@ -0,0 +1,204 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Cubos de latencia en segundos (de 5 ms a 2 min), suficientes para scraping, LLM y embeddings
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    escaped = (f'{name}="{value}"'.replace("\n", " ") for name, value in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """Histogramas, contadores y gauges en memoria con salida en formato Prometheus.
+
+    Sin dependencias: lo usan tanto api.py como guardials.py, que corren en
+    entornos distintos. Todas las operaciones son seguras entre hilos.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge_add(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} histogram"]
+                for key, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets, state["buckets"]):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {state['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state['sum']:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state['count']}")
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} {kind}"]
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe("stage_duration_seconds", "Duración de cada etapa (scraping, índice, recuperación, LLM...)")
+registry.describe("stage_errors_total", "Etapas terminadas con excepción")
+registry.describe("stage_in_flight", "Etapas en curso")
+registry.describe("http_request_duration_seconds", "Duración de las peticiones HTTP por ruta")
+registry.describe("http_requests_in_flight", "Peticiones HTTP en curso")
+
+
+@contextmanager
+def span(stage, **labels):
+    """Mide una etapa: histograma de duración, gauge de etapas en curso y contador de errores.
+
+    Sirve igual en código síncrono y dentro de corrutinas (``with span("x"):``).
+    """
+    registry.gauge_add("stage_in_flight", 1, stage=stage, **labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        registry.inc("stage_errors_total", stage=stage, error=type(e).__name__, **labels)
+        raise
+    finally:
+        registry.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+        registry.gauge_add("stage_in_flight", -1, stage=stage, **labels)
+
+
+def count(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de todos los hilos cada ``interval`` segundos.
+
+    Produce pilas "plegadas" (``func;func;func N``), el formato que leen
+    flamegraph.pl y speedscope. Con peticiones concurrentes las muestras
+    mezclan lo que hacen todas: para perfilar una sola, lanzarla aislada.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {samples}\n" for stack, samples in self.samples.most_common())
+
+
+# off: nunca; header: solo peticiones con "X-Profile: 1"; all: todas
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "off")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("cache", "profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+
+def instrument_app(app, app_name):
+    """Registra en la app FastAPI el middleware de métricas, el perfilador opcional y ``/metrics``."""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.middleware("http")
+    async def record_request(request: Request, call_next):
+        profiler = None
+        if PROFILE_REQUESTS == "all" or (PROFILE_REQUESTS == "header" and request.headers.get("x-profile") == "1"):
+            profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000).start()
+        registry.gauge_add("http_requests_in_flight", 1, app=app_name)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # La ruta como plantilla (/jobs/{job_id}) para no crear una serie por id
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            registry.observe("http_request_duration_seconds", time.perf_counter() - start,
+                             app=app_name, method=request.method, path=path, status=status)
+            registry.gauge_add("http_requests_in_flight", -1, app=app_name)
+            if profiler is not None:
+                # En respuestas en streaming solo cubre hasta que empieza el cuerpo
+                _dump_profile(profiler.stop(), app_name, path)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return registry.render()
+
+
+def _dump_profile(profiler, app_name, path):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = re.sub(r"[^\w.-]+", "_", path.strip("/")) or "root"
+    name = f"{app_name}-{time.strftime('%Y%m%d-%H%M%S')}-{route}-{os.getpid()}-{time.time_ns() % 1_000_000}"
+    file_path = os.path.join(PROFILE_DIR, f"{name}.folded")
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(profiler.folded())
+    print(f"Perfil de {path} guardado en {file_path}")
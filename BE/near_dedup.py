@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from text_chunker import CHUNK_SEPARATOR
+from segment_store import get_folder_store, path_lock
+
+DEDUP_DIR = ".dedup"
+# Similitud de Jaccard estimada (sobre pares de palabras) a partir de la cual dos párrafos son casi iguales
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+# Los párrafos cortos (títulos, precios) no se comparan: su firma no es fiable
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "8"))
+SHINGLE_SIZE = 2
+NUM_PERMUTATIONS = 64
+# Permutaciones universales (a*x + b) mod p sobre hashes de 32 bits: el producto cabe en
+# uint64 y, con p < 2**32, el resultado cabe en uint32
+_PRIME = np.uint64(4294967291)
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, NUM_PERMUTATIONS, dtype=np.uint64)
+# LSH: la firma se parte en LSH_BANDS bandas de LSH_ROWS valores y solo se comparan las firmas
+# que coinciden entera en alguna banda. Dos párrafos con Jaccard s son candidatos con
+# probabilidad 1 - (1 - s**4)**16: ~0.89 en el umbral (0.6), ~0.99 a partir de 0.7; a cambio
+# cada párrafo se compara con unas pocas firmas y no con todas las de la carpeta
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+# Multiplicadores impares para reducir cada banda a una clave de 64 bits (las colisiones se descartan al verificar)
+_BAND_MIX = _rng.integers(1, 1 << 63, LSH_ROWS, dtype=np.uint64) | np.uint64(1)
+# Aproximación habitual de tokens del LLM por carácter
+CHARS_PER_TOKEN = 4
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _folder_lock(folder_path):
+    # Entre hilos y entre workers: las huellas se leen, amplían y guardan sin que otro proceso las pise
+    path = os.path.join(folder_path, DEDUP_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path_lock(os.path.join(path, "LOCK"))
+
+
+def minhash(text):
+    # Firma MinHash del párrafo (NUM_PERMUTATIONS valores), o None si es demasiado corto
+    words = _WORD.findall(text.lower())
+    if len(words) < DEDUP_MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.frombuffer(b"".join(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest() for shingle in shingles
+    ), dtype=np.uint32).astype(np.uint64)
+    # Todas las permutaciones a la vez: matriz (pares de palabras x permutaciones) y mínimo por columna
+    return ((hashes[:, None] * _PERM_A + _PERM_B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def _band_keys(fingerprints):
+    # Clave de cada banda de cada firma: matriz (firmas x LSH_BANDS); la multiplicación desborda a propósito
+    bands = fingerprints.reshape(-1, LSH_BANDS, LSH_ROWS).astype(np.uint64)
+    return (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+
+class FolderDeduplicator:
+    """Elimina párrafos casi duplicados de una carpeta al escribir cada archivo.
+
+    Guarda en ``<carpeta>/.dedup/`` la firma MinHash de cada párrafo ya almacenado y
+    el archivo al que pertenece, así cada archivo nuevo solo se compara con lo
+    que ya hay, y solo con las firmas que comparten alguna banda LSH. Si un archivo
+    desaparece del segmento de la carpeta, sus huellas se descartan al cargar.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(folder_path, DEDUP_DIR)
+        self.lock = _folder_lock(folder_path)
+        self.store = get_folder_store(folder_path)
+        self._stamp = None
+        with self.lock:
+            self._load()
+
+    def _state_stamp(self):
+        # Cambia si otro proceso guardó huellas (os.replace: inodo nuevo) o si cambió el segmento
+        try:
+            st = os.stat(os.path.join(self.path, "state.json"))
+        except FileNotFoundError:
+            st = None
+        return (st and (st.st_ino, st.st_mtime_ns, st.st_size), self.store.signature())
+
+    def _load(self):
+        stamp = self._state_stamp()
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self.fingerprints = np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        self.owners = []
+        self.totals = {"files": 0, "paragraphs": 0, "duplicates": 0, "bytes_saved": 0, "tokens_saved": 0}
+        try:
+            fingerprints = np.load(os.path.join(self.path, "fingerprints.npy"))
+            with open(os.path.join(self.path, "state.json"), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._index()
+            return
+        self.totals.update(state.get("totals", {}))
+        owners = state.get("owners", [])
+        existing = set(owners) & set(self.store.names())
+        alive = np.array([owner in existing for owner in owners], dtype=bool)
+        if fingerprints.ndim != 2 or fingerprints.shape[1] != NUM_PERMUTATIONS or len(alive) != len(fingerprints):
+            # Formato distinto o estado a medias: se empieza de cero
+            self.owners = []
+            self._index()
+            return
+        self.fingerprints = fingerprints[alive]
+        self.owners = [owner for owner, keep in zip(owners, alive) if keep]
+        self._index()
+
+    def _index(self):
+        # Por banda, las claves ordenadas y la fila de cada una: los candidatos salen por búsqueda binaria
+        keys = _band_keys(self.fingerprints).T
+        self._band_rows = np.argsort(keys, axis=1, kind="stable")
+        self._band_sorted = np.take_along_axis(keys, self._band_rows, axis=1)
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, f"fingerprints.tmp-{os.getpid()}.npy")
+        np.save(tmp_path, self.fingerprints)
+        os.replace(tmp_path, os.path.join(self.path, "fingerprints.npy"))
+        tmp_path = os.path.join(self.path, f"state.tmp-{os.getpid()}.json")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"owners": self.owners, "totals": self.totals}, f)
+        os.replace(tmp_path, os.path.join(self.path, "state.json"))
+        self._stamp = self._state_stamp()
+
+    def _candidates(self, fingerprint):
+        # Filas guardadas que coinciden con la firma en al menos una banda
+        rows = [self._band_rows[band, np.searchsorted(self._band_sorted[band], key, "left"):
+                                      np.searchsorted(self._band_sorted[band], key, "right")]
+                for band, key in enumerate(_band_keys(fingerprint)[0])]
+        return np.unique(np.concatenate(rows))
+
+    def _is_duplicate(self, fingerprint, new):
+        # Fracción de permutaciones con el mismo mínimo = Jaccard estimada. Lo guardado se
+        # consulta por bandas LSH; las firmas de este mismo archivo son pocas y van todas
+        for known in (self.fingerprints[self._candidates(fingerprint)], new):
+            if len(known) and float((known == fingerprint).mean(axis=1).max()) >= DEDUP_THRESHOLD:
+                return True
+        return False
+
+    def write(self, filename, content, header=""):
+        """Quita los párrafos ya vistos en la carpeta y escribe ``header + contenido``.
+
+        Respeta los fragmentos del scraper (CHUNK_SEPARATOR): un fragmento que se
+        queda vacío desaparece. Si todos los párrafos con cuerpo (los que tienen
+        firma) eran repetidos no se escribe el archivo: los títulos y líneas
+        cortas que sobreviven no bastan. Devuelve (escrito, estadísticas).
+        """
+        with self.lock:
+            # Otro proceso o petición pudo escribir en la carpeta desde que se cargó
+            self._load()
+            stats = {"paragraphs": 0, "duplicates": 0, "bytes_saved": 0, "tokens_saved": 0}
+            # Firmas nuevas de este archivo: una fila por párrafo como mucho, reservadas de una vez
+            new = np.empty((content.count("\n") + content.count(CHUNK_SEPARATOR) + 1, NUM_PERMUTATIONS),
+                           dtype=np.uint32)
+            new_count = 0
+            kept_chunks = []
+            for chunk in content.split(CHUNK_SEPARATOR):
+                kept = []
+                for paragraph in chunk.split("\n"):
+                    fingerprint = minhash(paragraph)
+                    if fingerprint is not None:
+                        stats["paragraphs"] += 1
+                        if self._is_duplicate(fingerprint, new[:new_count]):
+                            stats["duplicates"] += 1
+                            stats["bytes_saved"] += len(paragraph.encode("utf-8")) + 1
+                            continue
+                        new[new_count] = fingerprint
+                        new_count += 1
+                    kept.append(paragraph)
+                text = "\n".join(kept)
+                if text.strip():
+                    kept_chunks.append(text)
+            stats["tokens_saved"] = stats["bytes_saved"] // CHARS_PER_TOKEN
+
+            # Hace falta algún párrafo con cuerpo nuevo; una página sin ninguno comparable
+            # (solo líneas cortas) no puede ser repetida y se guarda si tiene texto
+            written = bool(new_count) or (not stats["paragraphs"] and bool(kept_chunks))
+            if written:
+                # La página se guarda con el candado tomado: quien cargue las huellas después
+                # ya la encuentra en el segmento y no las descarta
+                self.store.put(filename, header + CHUNK_SEPARATOR.join(kept_chunks))
+            if new_count and written:
+                self.fingerprints = np.concatenate([self.fingerprints, new[:new_count]])
+                self.owners.extend([filename] * new_count)
+                self._index()
+            self.totals["files"] += 1
+            for key, value in stats.items():
+                self.totals[key] += value
+            self._save()
+            return written, stats
+
+    def stats(self):
+        with self.lock:
+            return {**self.totals, "fingerprints": len(self.fingerprints)}
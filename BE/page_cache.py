@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Parámetros de seguimiento que no cambian el contenido de la página
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$", re.IGNORECASE)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def parse_max_age(cache_control):
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+class PageCache:
+    """Almacén global de páginas scrapeadas, compartido entre todas las carpetas.
+
+    El índice (SQLite) va por URL normalizada y el texto se guarda una sola vez
+    por hash de contenido en ``blobs/``. Cada página guarda ETag/Last-Modified
+    para revalidarla con un GET condicional cuando caduca.
+    """
+
+    def __init__(self, root=None, default_max_age=None, min_age=None, max_age=None):
+        self.root = root or os.getenv("PAGE_CACHE_DIR", os.path.join("cache", "pages"))
+        self.default_max_age = default_max_age or int(os.getenv("PAGE_CACHE_DEFAULT_MAX_AGE", "21600"))
+        # La frescura se acota: muchas webs mandan max-age=0 o no-store y no queremos
+        # relanzar el scraping en cada plan de viaje
+        self.min_age = min_age or int(os.getenv("PAGE_CACHE_MIN_AGE", "600"))
+        self.max_age = max_age or int(os.getenv("PAGE_CACHE_MAX_AGE", "86400"))
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.root, "pages.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, content_hash TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL NOT NULL, max_age INTEGER NOT NULL, tier TEXT)"
+        )
+        self._db.commit()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.root, "blobs", content_hash[:2], f"{content_hash}.txt")
+
+    def lookup(self, url):
+        # Devuelve el registro de la página con su contenido, o None si no está
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at, max_age, tier FROM pages WHERE url = ?",
+                (normalize_url(url),),
+            ).fetchone()
+        if row is None:
+            return None
+        content_hash, etag, last_modified, fetched_at, max_age, tier = row
+        try:
+            with open(self._blob_path(content_hash), "r", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return {"content": content, "etag": etag, "last_modified": last_modified,
+                "fresh": time.time() - fetched_at < max_age, "tier": tier}
+
+    def _freshness(self, headers):
+        max_age = parse_max_age((headers or {}).get("cache-control"))
+        if max_age is None:
+            max_age = self.default_max_age
+        return max(self.min_age, min(self.max_age, max_age))
+
+    def store(self, url, content, headers=None, tier=None):
+        headers = headers or {}
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, content_hash, etag, last_modified, fetched_at, max_age, tier) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), content_hash, headers.get("etag"), headers.get("last-modified"),
+                 time.time(), self._freshness(headers), tier),
+            )
+            self._db.commit()
+
+    def touch(self, url, headers=None):
+        # Tras un 304: la copia sigue siendo válida, se reinicia su frescura
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, max_age = ? WHERE url = ?",
+                (time.time(), self._freshness(headers), normalize_url(url)),
+            )
+            self._db.commit()
+
+    def record(self, outcome):
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            return {"pages": pages, "hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+_page_cache = None
+
+
+def get_page_cache():
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
@@ -0,0 +1,85 @@
+import os
+import re
+import numpy as np
+from text_chunker import CHUNK_SEPARATOR
+
+# Terms that mark hotel/review content (English and Spanish, as scraped pages mix both)
+HOTEL_TERMS = (
+    "hotel", "hotels", "hostel", "resort", "apartment", "room", "rooms", "suite", "bed", "beds",
+    "breakfast", "pool", "spa", "gym", "beach", "view", "views", "balcony", "bathroom", "shower",
+    "price", "prices", "rate", "rates", "night", "nights", "per", "stay", "stayed", "booking",
+    "review", "reviews", "rating", "rated", "stars", "star", "guest", "guests", "staff", "service",
+    "clean", "comfortable", "quiet", "noisy", "location", "located", "walk", "minutes", "wifi",
+    "parking", "check", "amenities", "restaurant", "bar", "reception", "family", "pets",
+    "habitación", "habitaciones", "cama", "desayuno", "piscina", "playa", "vista", "baño",
+    "precio", "precios", "tarifa", "noche", "noches", "estancia", "reserva", "opinión", "opiniones",
+    "reseña", "reseñas", "valoración", "estrellas", "huésped", "huéspedes", "personal", "servicio",
+    "limpio", "limpia", "cómodo", "cómoda", "tranquilo", "ubicación", "ubicado", "minutos",
+    "aparcamiento", "recepción", "restaurante",
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _query_terms():
+    custom = os.getenv("PASSAGE_TERMS")
+    if custom:
+        return tuple(term.strip().lower() for term in custom.split(",") if term.strip())
+    return HOTEL_TERMS
+
+
+def split_passages(text):
+    # Scraped files are one paragraph per line, grouped in chunks by CHUNK_SEPARATOR
+    return [line.strip() for line in text.replace(CHUNK_SEPARATOR, "\n").split("\n") if line.strip()]
+
+
+def score_passages(passages, terms=None, k1=1.5, b=0.75):
+    """BM25 score of every passage against the hotel vocabulary, computed as one matrix.
+
+    IDF comes from the passages of the same file, so a term that appears in every
+    paragraph (the hotel name, say) counts for little.
+    """
+    terms = terms or _query_terms()
+    term_ids = {term: i for i, term in enumerate(terms)}
+    rows, cols, lengths = [], [], np.zeros(len(passages), dtype=np.float32)
+    for row, passage in enumerate(passages):
+        tokens = _TOKEN.findall(passage.lower())
+        lengths[row] = len(tokens)
+        for token in tokens:
+            col = term_ids.get(token)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    tf = np.zeros((len(passages), len(terms)), dtype=np.float32)
+    np.add.at(tf, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    return ((tf * (k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def select_passages(text, budget_chars, terms=None):
+    """Pack the highest-scoring paragraphs into budget_chars, keeping their original order.
+
+    Text that already fits is returned unchanged. Paragraphs without any hotel term
+    are only used to fill leftover space, and the best paragraph is cut to fit when
+    nothing else does.
+    """
+    if len(text) <= budget_chars:
+        return text
+    passages = split_passages(text)
+    if not passages:
+        return text[:budget_chars]
+    scores = score_passages(passages, terms)
+
+    chosen, used = [], 0
+    # Highest score first; ties (typically zero) keep the page order
+    for index in np.argsort(-scores, kind="stable"):
+        size = len(passages[index]) + 1
+        if used + size <= budget_chars:
+            chosen.append(index)
+            used += size
+    if not chosen:
+        return passages[int(np.argmax(scores))][:budget_chars]
+    return "\n".join(passages[index] for index in sorted(chosen))
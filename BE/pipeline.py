@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+
+# Colas acotadas entre etapas: si el indexado se atrasa, el scraping espera (y viceversa)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+PIPELINE_SCRAPE_WORKERS = int(os.getenv("PIPELINE_SCRAPE_WORKERS", "8"))
+
+_DONE = object()
+
+# Carpetas con un pipeline en marcha (y cuántos): sus consultas usan el último índice publicado
+active_folders = {}
+
+
+class SearchScrapeIndexPipeline:
+    """Búsqueda → scraping → indexado con las tres etapas solapadas.
+
+    Cada enlace pasa al scraping en cuanto sale de la búsqueda y cada página
+    guardada se embebe en el índice de la carpeta en cuanto llega (el indexado
+    agrupa lo que se haya acumulado mientras embebía lo anterior). Las etapas se
+    inyectan para no acoplar este módulo a la API:
+
+    - ``search(subject)`` -> lista de resultados con ``link``
+    - ``scrape(url)`` -> resultado del ScrapingEngine
+    - ``store(result)`` -> evento con ``file`` si la página está en la carpeta
+    - ``index()`` -> dict con el estado del índice (bloqueante, se ejecuta en un hilo)
+    """
+
+    def __init__(self, folder_path, search, scrape, store, index, scrape_workers=None, queue_size=None):
+        self.folder_path = folder_path
+        self.search = search
+        self.scrape = scrape
+        self.store = store
+        self.index = index
+        self.scrape_workers = scrape_workers or PIPELINE_SCRAPE_WORKERS
+        self.queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.timings = {"search": 0.0, "scrape": 0.0, "index": 0.0}
+
+    async def run(self, subjects):
+        # Generador asíncrono de eventos de las tres etapas, en el orden en que ocurren
+        links = asyncio.Queue(self.queue_size)
+        pages = asyncio.Queue(self.queue_size)
+        events = asyncio.Queue()
+        start = time.perf_counter()
+
+        async def search_stage():
+            seen = set()
+
+            async def one(subject):
+                stage_start = time.perf_counter()
+                results = await self.search(subject)
+                self.timings["search"] += time.perf_counter() - stage_start
+                if isinstance(results, dict) and "error" in results:
+                    await events.put({"event": "error", "stage": "search", "detail": results["error"]})
+                    return
+                for item in results:
+                    link = item.get("link")
+                    if link and link not in seen:
+                        seen.add(link)
+                        await events.put({"event": "link", "url": link, "title": item.get("title")})
+                        await links.put(link)
+
+            try:
+                await asyncio.gather(*(one(subject) for subject in subjects))
+            finally:
+                for _ in range(self.scrape_workers):
+                    await links.put(_DONE)
+
+        async def scrape_worker():
+            while True:
+                url = await links.get()
+                if url is _DONE:
+                    break
+                stage_start = time.perf_counter()
+                try:
+                    stored = await self.store(await self.scrape(url))
+                except Exception as e:
+                    stored = {"url": url, "file": None, "status": "Error", "error": str(e)}
+                self.timings["scrape"] += time.perf_counter() - stage_start
+                await events.put({"event": "result", **stored})
+                if stored.get("file"):
+                    await pages.put(stored)
+
+        async def scrape_stage():
+            try:
+                await asyncio.gather(*(scrape_worker() for _ in range(self.scrape_workers)))
+            finally:
+                await pages.put(_DONE)
+
+        async def index_stage():
+            finished = False
+            while not finished:
+                batch = [await pages.get()]
+                # Todo lo que llegó mientras se indexaba el lote anterior va en un solo update
+                while not pages.empty():
+                    batch.append(pages.get_nowait())
+                finished = _DONE in batch
+                files = [page["file"] for page in batch if page is not _DONE]
+                if not files:
+                    continue
+                stage_start = time.perf_counter()
+                try:
+                    state = await asyncio.to_thread(self.index)
+                except Exception as e:
+                    await events.put({"event": "error", "stage": "index", "detail": str(e)})
+                    continue
+                finally:
+                    self.timings["index"] += time.perf_counter() - stage_start
+                await events.put({"event": "indexed", "files": files, **state,
+                                  "elapsed": round(time.perf_counter() - start, 3)})
+
+        async def run_stages():
+            stages = [asyncio.ensure_future(stage()) for stage in (search_stage, scrape_stage, index_stage)]
+            try:
+                await asyncio.gather(*stages)
+            finally:
+                # Si una etapa falla, las demás no deben quedarse esperando en una cola
+                for stage in stages:
+                    if not stage.done():
+                        stage.cancel()
+                await events.put(_DONE)
+
+        active_folders[self.folder_path] = active_folders.get(self.folder_path, 0) + 1
+        runner = asyncio.ensure_future(run_stages())
+        try:
+            while True:
+                event = await events.get()
+                if event is _DONE:
+                    break
+                yield event
+            await runner
+        finally:
+            # Si el cliente se desconecta se cancela todo lo pendiente
+            if not runner.done():
+                runner.cancel()
+            active_folders[self.folder_path] -= 1
+            if not active_folders[self.folder_path]:
+                del active_folders[self.folder_path]
+        yield {"event": "done", "elapsed": round(time.perf_counter() - start, 3),
+               "stage_seconds": {stage: round(seconds, 3) for stage, seconds in self.timings.items()}}
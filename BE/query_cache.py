@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+import numpy as np
+
+
+class SemanticQueryCache:
+    """Respuestas de LlamaIndexAnalyzer.query reutilizables entre preguntas parecidas.
+
+    Las entradas se agrupan por carpeta y recuerdan la versión del índice con la
+    que se generaron; si el índice cambia, se descartan todas las de esa carpeta.
+    """
+
+    def __init__(self, max_distance=None, ttl=None, max_entries=None):
+        self.max_distance = max_distance if max_distance is not None else float(os.getenv("QUERY_CACHE_MAX_DISTANCE", "0.1"))
+        self.ttl = ttl or float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+        self._folders = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _folder(self, folder, version):
+        entry = self._folders.get(folder)
+        if entry is None or entry["version"] != version:
+            # Índice nuevo: las respuestas anteriores ya no valen
+            entry = {"version": version, "vectors": [], "results": [], "created": []}
+            self._folders[folder] = entry
+        return entry
+
+    def _expire(self, entry, now):
+        keep = [i for i, created in enumerate(entry["created"]) if now - created < self.ttl]
+        if len(keep) != len(entry["created"]):
+            for key in ("vectors", "results", "created"):
+                entry[key] = [entry[key][i] for i in keep]
+
+    def lookup(self, folder, version, embedding):
+        query = self._normalize(embedding)
+        with self._lock:
+            entry = self._folder(folder, version)
+            self._expire(entry, time.time())
+            if entry["vectors"]:
+                distances = 1.0 - np.vstack(entry["vectors"]) @ query
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self.hits += 1
+                    return entry["results"][best]
+            self.misses += 1
+            return None
+
+    def store(self, folder, version, embedding, result):
+        with self._lock:
+            entry = self._folder(folder, version)
+            entry["vectors"].append(self._normalize(embedding))
+            entry["results"].append(result)
+            entry["created"].append(time.time())
+            # Se descartan las más antiguas al superar el máximo por carpeta
+            for key in ("vectors", "results", "created"):
+                entry[key] = entry[key][-self.max_entries:]
+
+    def invalidate(self, folder):
+        with self._lock:
+            self._folders.pop(folder, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "folders": len(self._folders),
+                "entries": sum(len(entry["results"]) for entry in self._folders.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "max_distance": self.max_distance,
+                "ttl": self.ttl,
+            }
+
+
+query_cache = SemanticQueryCache()
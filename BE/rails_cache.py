@@ -0,0 +1,99 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def rails_config_version(config_path):
+    # Hash of every file in the rails config folder; editing a flow or prompt changes it
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(config_path)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, config_path).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class RailsCache:
+    """Persistent cache of rails outputs keyed by the exact content sent to the LLM.
+
+    Backed by a local SQLite file and shared by every folder, so the same page
+    scraped into several folders is only sent to the rails once. Entries are
+    evicted least-recently-used first once the stored responses exceed max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=None, config_version=""):
+        self.path = path or os.getenv("RAILS_CACHE_PATH", os.path.join("cache", "rails_cache.sqlite3"))
+        self.max_bytes = max_bytes or int(os.getenv("RAILS_CACHE_MAX_MB", "64")) * 1024 * 1024
+        self.config_version = config_version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+        self._db.commit()
+
+    def key(self, content):
+        return hashlib.sha256(f"{self.config_version}\0{content}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT response FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "config_version": self.config_version,
+            }
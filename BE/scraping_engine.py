@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import weakref
+from urllib.parse import urlparse
+
+
+class ScrapingEngine:
+    """Ejecuta scrapers en paralelo con un límite global y otro por host.
+
+    Los semáforos se comparten entre peticiones, así que el límite global vale
+    para todo el proceso y no solo para un plan de viaje.
+    """
+
+    def __init__(self, max_concurrency=None, per_host_concurrency=None):
+        self.max_concurrency = max_concurrency or int(os.getenv("SCRAPER_MAX_CONCURRENCY", "8"))
+        self.per_host_concurrency = per_host_concurrency or int(os.getenv("SCRAPER_PER_HOST_CONCURRENCY", "2"))
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Los semáforos de host desaparecen solos cuando nadie los está usando
+        self._host_semaphores = weakref.WeakValueDictionary()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc.lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_concurrency)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def scrape_one(self, url, scraper_class):
+        # Primero el semáforo del host: esperar a un host ocupado no debe
+        # bloquear un hueco global que otro host podría aprovechar
+        async with self._host_semaphore(url):
+            async with self._global_semaphore:
+                start = time.perf_counter()
+                scraper = scraper_class(url)
+                try:
+                    content = await scraper.scrape()
+                    error = None
+                except Exception as e:
+                    content, error = None, str(e)
+                # Los scrapers por niveles indican qué nivel sirvió la URL
+                return {"url": url, "content": content, "error": error,
+                        "tier": getattr(scraper, "tier", None),
+                        "elapsed": time.perf_counter() - start}
+
+    async def scrape(self, urls, scraper_class):
+        # Generador asíncrono: entrega cada resultado en cuanto termina
+        tasks = [asyncio.ensure_future(self.scrape_one(url, scraper_class)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Si el consumidor abandona (cliente desconectado), cancelar lo pendiente
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+_scraping_engine = None
+
+
+def get_scraping_engine():
+    global _scraping_engine
+    if _scraping_engine is None:
+        _scraping_engine = ScrapingEngine()
+    return _scraping_engine
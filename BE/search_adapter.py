@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+from pydantic import BaseModel
+from metrics import count
+
+# Resultados por página (antes fijo en 5) y región de DuckDuckGo
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "10"))
+SEARCH_REGION = os.getenv("SEARCH_REGION", "wt-wt")
+SEARCH_SAFESEARCH = os.getenv("SEARCH_SAFESEARCH", "moderate")
+SEARCH_RETRIES = int(os.getenv("SEARCH_RETRIES", "2"))
+SEARCH_RETRY_BACKOFF = float(os.getenv("SEARCH_RETRY_BACKOFF", "1"))
+# Paginación: como mucho SEARCH_MAX_DEPTH resultados por consulta (las páginas más allá
+# salen vacías). La lista ya deduplicada de cada consulta se guarda SEARCH_CACHE_TTL segundos
+SEARCH_MAX_DEPTH = int(os.getenv("SEARCH_MAX_DEPTH", "100"))
+SEARCH_PAGE_CACHE_SIZE = int(os.getenv("SEARCH_PAGE_CACHE_SIZE", "256"))
+SEARCH_PAGE_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+
+
+class SearchResult(BaseModel):
+    title: str
+    snippet: str = ""
+    link: str
+    rank: int = 0  # posición en los resultados de su consulta, desde 0
+
+    def to_dict(self):
+        # Misma forma que devolvía DuckDuckGoTool: la usan la API, el pipeline y el agente
+        return {"title": self.title, "snippet": self.snippet, "link": self.link}
+
+
+def _normalize_link(link):
+    # Sin fragmento: la misma página con #seccion distinta no se scrapea dos veces
+    parts = urlsplit(link.strip())
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ""))
+
+
+class DuckDuckGoSearch:
+    """Búsqueda en DuckDuckGo con resultados estructurados.
+
+    Usa directamente la API de ``duckduckgo_search`` (lista de dicts con
+    ``title``, ``href`` y ``body``) en lugar de convertir la salida a texto y
+    recuperar los campos con expresiones regulares: una coma en un snippet ya
+    no desalinea títulos y enlaces. Solo devuelve enlaces http(s), sin repetir.
+    """
+
+    def __init__(self, region=SEARCH_REGION, safesearch=SEARCH_SAFESEARCH):
+        self.region = region
+        self.safesearch = safesearch
+        # consulta -> (momento, resultados pedidos, lista deduplicada, DDG no tenía más)
+        self._pages = OrderedDict()
+        self._pages_lock = threading.Lock()
+
+    def _text(self, query, max_results):
+        # El paquete se importa al primer uso (y así también se puede sustituir en los benchmarks)
+        from duckduckgo_search import DDGS
+
+        for attempt in range(SEARCH_RETRIES + 1):
+            try:
+                return DDGS().text(query, region=self.region, safesearch=self.safesearch,
+                                   max_results=max_results) or []
+            except Exception as e:
+                # DDG limita por IP (RatelimitException): se reintenta con espera creciente
+                if attempt == SEARCH_RETRIES or "ratelimit" not in type(e).__name__.lower():
+                    raise
+                count("search_rate_limited_total")
+                time.sleep(SEARCH_RETRY_BACKOFF * 2 ** attempt)
+
+    def search(self, query, max_results=None, page=0):
+        """Página ``page`` (desde 0) de ``max_results`` resultados de ``query``.
+
+        DuckDuckGo pagina internamente con su propio cursor y no admite saltar a
+        una página: hay que pedir todos los resultados hasta el final de la
+        página. Para que recorrer páginas no repita la petición cada vez, la
+        lista deduplicada de la consulta se guarda y, cuando se queda corta, se
+        pide el doble (hasta ``SEARCH_MAX_DEPTH`` resultados por consulta).
+        """
+        max_results = max_results or SEARCH_MAX_RESULTS
+        start, end = page * max_results, min((page + 1) * max_results, SEARCH_MAX_DEPTH)
+        if start >= end:
+            return []
+        with self._pages_lock:
+            cached = self._pages.get(query)
+            if cached is not None and time.time() - cached[0] > SEARCH_PAGE_CACHE_TTL:
+                cached = None
+        if cached is not None and (len(cached[2]) >= end or cached[3]):
+            count("search_page_cache_total", result="hit")
+            return cached[2][start:end]
+        count("search_page_cache_total", result="miss")
+
+        requested = min(max(end, 2 * cached[1] if cached else end), SEARCH_MAX_DEPTH)
+        raw = self._text(query, requested)
+        results, seen = [], set()
+        for item in raw:
+            link = _normalize_link(item.get("href") or item.get("link") or "")
+            if not link.startswith(("http://", "https://")) or link in seen:
+                continue
+            seen.add(link)
+            results.append(SearchResult(title=item.get("title") or "", snippet=item.get("body") or "",
+                                        link=link, rank=len(results)))
+        with self._pages_lock:
+            self._pages[query] = (time.time(), requested, results, len(raw) < requested)
+            self._pages.move_to_end(query)
+            while len(self._pages) > SEARCH_PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        return results[start:end]
+
+
+_search = None
+
+
+def get_search():
+    # Un solo adaptador para todo el proceso
+    global _search
+    if _search is None:
+        _search = DuckDuckGoSearch()
+    return _search
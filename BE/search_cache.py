@@ -0,0 +1,93 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SearchCache:
+    """Caché TTL de resultados de búsqueda con coalescencia de peticiones.
+
+    - Dentro del TTL se devuelve el resultado guardado.
+    - Pasado el TTL pero dentro de ``stale_ttl`` se devuelve el resultado viejo
+      y se refresca en segundo plano.
+    - N peticiones simultáneas de la misma consulta comparten una sola llamada.
+    """
+
+    def __init__(self, ttl=None, stale_ttl=None, max_entries=None, max_workers=None):
+        self.ttl = ttl or float(os.getenv("SEARCH_CACHE_TTL", "900"))
+        self.stale_ttl = stale_ttl or float(os.getenv("SEARCH_CACHE_STALE_TTL", "3600"))
+        self.max_entries = max_entries or int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+        # Pool acotado para las llamadas bloqueantes: un proveedor lento no puede
+        # acaparar el threadpool por defecto que usa el resto de la aplicación
+        self.max_workers = max_workers or int(os.getenv("SEARCH_MAX_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="search")
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    async def get_or_fetch(self, key, fetch):
+        # fetch es una función bloqueante; se ejecuta en el pool de búsqueda
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry["created"]
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry["value"]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    self._start_fetch(key, fetch)
+                return entry["value"]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_fetch(key, fetch)
+        # shield: si un cliente se desconecta no se cancela la llamada de los demás
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key, fetch):
+        task = asyncio.ensure_future(self._fetch(key, fetch))
+        self._inflight[key] = task
+        # Evita el aviso de excepción no recuperada en refrescos que nadie espera
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key, fetch):
+        try:
+            value = await asyncio.get_running_loop().run_in_executor(self._executor, fetch)
+            # Solo se guardan resultados correctos: los errores se propagan sin cachear
+            self._entries[key] = {"value": value, "created": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "max_workers": self.max_workers,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "background_refreshes": self.refreshes,
+            "hit_rate": round((self.hits + self.stale_hits + self.coalesced) / lookups, 4) if lookups else None,
+        }
+
+
+search_cache = SearchCache()
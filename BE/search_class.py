@@ -2,9 +2,14 @@ import os
 import json
 import warnings
 import yaml
+import asyncio
+import threading
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, LLM
 from tools import DuckDuckGoTool, TextSaveTool
+from search_cache import search_cache
+from search_adapter import get_search, SEARCH_MAX_RESULTS
+from metrics import span
 from typing import List, Dict
 warnings.filterwarnings('ignore')
 
@@ -85,23 +90,45 @@ class TaskExecutor:
         return json.dumps(result_content, indent=2) if isinstance(result_content, (list, dict)) else str(result_content)
 
 
+class YamlConfig:
+    # YAML cargado una vez y recargado solo si el archivo cambia en disco (os.stat por acceso)
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._data = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, 'r') as file:
+                        self._data = yaml.safe_load(file)
+                    self._mtime = mtime
+        return self._data
+
+
+tasks_config = YamlConfig('config/tasks.yaml')
+
+
 class TaskExecutorSimple:
     def __init__(self):
-        self.search_tool = DuckDuckGoTool()
+        self.search = get_search()
 
-    def run_simple_search(self, subject):
-        try:
-            # Cargar configuración de la tarea directamente desde tasks.yaml
-            with open('config/tasks.yaml', 'r') as file:
-                tasks_config = yaml.safe_load(file)
+    def build_query(self, subject):
+        task_config = tasks_config.get().get('simple_search_task')
+        if not task_config:
+            raise ValueError("Task configuration 'simple_search_task' not found in tasks.yaml")
+        return task_config['description'].format(subject=subject)
 
-            task_config = tasks_config.get('simple_search_task')
-            if not task_config:
-                raise ValueError("Task configuration 'simple_search_task' not found in tasks.yaml")
+    def run_simple_search(self, subject, max_results=None, page=0):
+        try:
+            # Configuración de la tarea precargada desde tasks.yaml
+            query = self.build_query(subject)
 
-            # Ejecutar la búsqueda directamente usando el DuckDuckGoTool
-            query = task_config['description'].format(subject=subject)
-            results = self.search_tool._run(query)
+            # Ejecutar la búsqueda directamente con el adaptador de DuckDuckGo
+            results = self._fetch(query, max_results, page)
 
             # Retornar resultados en formato JSON
             return results
@@ -110,3 +137,39 @@ class TaskExecutorSimple:
             return {"error": f"Configuration file not found: {str(e)}"}
         except Exception as e:
             return {"error": str(e)}
+
+    async def run_simple_search_async(self, subject, max_results=None, page=0):
+        # Igual que run_simple_search, pero sin bloquear el event loop: caché TTL,
+        # coalescencia de consultas idénticas y la llamada a DuckDuckGo en un pool acotado
+        try:
+            query = self.build_query(subject)
+            key = (query, max_results or SEARCH_MAX_RESULTS, page)
+            with span("search"):
+                return await search_cache.get_or_fetch(key, lambda: self._fetch(query, max_results, page))
+
+        except FileNotFoundError as e:
+            return {"error": f"Configuration file not found: {str(e)}"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def run_batch_search_async(self, subjects, max_results=None):
+        # Varios destinos a la vez, cada uno con su entrada de caché: {destino: resultados}
+        subjects = list(dict.fromkeys(subjects))
+        results = await asyncio.gather(*(self.run_simple_search_async(subject, max_results) for subject in subjects))
+        return dict(zip(subjects, results))
+
+    def _fetch(self, query, max_results=None, page=0):
+        # Llamada real a DuckDuckGo (los aciertos de caché no pasan por aquí)
+        with span("search_fetch"):
+            return [result.to_dict() for result in self.search.search(query, max_results, page)]
+
+
+_simple_executor = None
+
+
+def get_simple_executor():
+    # Un solo ejecutor (y una sola herramienta de búsqueda) para todo el proceso
+    global _simple_executor
+    if _simple_executor is None:
+        _simple_executor = TaskExecutorSimple()
+    return _simple_executor
@@ -0,0 +1,546 @@
+import os
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin flock, los candados solo protegen entre hilos del mismo proceso
+    fcntl = None
+
+STORE_DIR = ".store"
+# Archivos sueltos que se empaquetan en el segmento (páginas scrapeadas y location_data.json)
+PACKED_EXTENSIONS = (".txt", ".json")
+# Como mucho una escritura de last_access por minuto y carpeta
+ACCESS_TOUCH_INTERVAL = 60
+READ_BLOCK_SIZE = 64 * 1024
+
+_folder_locks = {}
+_folder_locks_guard = threading.Lock()
+# Carpetas en uso en este proceso (pipelines, trabajos, análisis, rails) y cuántas veces
+_in_use = {}
+_in_use_guard = threading.Lock()
+
+
+class _FolderLock:
+    """Candado entre hilos (RLock) y entre procesos (flock de un archivo, p. ej. ``.store/LOCK``).
+
+    Reentrante: el flock se toma al entrar la primera vez y se suelta al salir la
+    última, así los métodos del almacén pueden llamarse entre sí con el candado tomado.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._file = open(self.lock_path, "a+b")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            # Cerrar el descriptor suelta el flock
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+
+def path_lock(lock_path):
+    """Candado reentrante entre hilos y procesos sobre ``lock_path`` (uno por ruta y proceso).
+
+    El directorio del archivo debe existir. Lo usan también el índice y la deduplicación
+    con su propio archivo, para no bloquear las lecturas del almacén mientras trabajan.
+    """
+    with _folder_locks_guard:
+        key = os.path.abspath(lock_path)
+        lock = _folder_locks.get(key)
+        if lock is None:
+            lock = _folder_locks[key] = _FolderLock(key)
+        return lock
+
+
+def _folder_lock(folder_path):
+    return path_lock(os.path.join(folder_path, STORE_DIR, "LOCK"))
+
+
+@contextmanager
+def folder_in_use(folder_path):
+    """Marca la carpeta como en uso mientras dura el bloque: el recolector no la toca.
+
+    Dentro del proceso lleva la cuenta en ``_in_use``; entre procesos mantiene un
+    flock compartido sobre ``.store/IN_USE``, que el recolector intenta tomar en
+    exclusiva antes de borrar.
+    """
+    key = os.path.abspath(folder_path)
+    with _in_use_guard:
+        _in_use[key] = _in_use.get(key, 0) + 1
+    marker = None
+    try:
+        if fcntl is not None:
+            os.makedirs(os.path.join(folder_path, STORE_DIR), exist_ok=True)
+            marker = open(os.path.join(folder_path, STORE_DIR, "IN_USE"), "a+b")
+            fcntl.flock(marker, fcntl.LOCK_SH)
+        yield
+    finally:
+        if marker is not None:
+            marker.close()
+        with _in_use_guard:
+            _in_use[key] -= 1
+            if not _in_use[key]:
+                del _in_use[key]
+
+
+def folder_is_busy(folder_path):
+    # Solo ve el uso de este proceso; el de los demás lo detecta el flock de IN_USE al borrar
+    with _in_use_guard:
+        return os.path.abspath(folder_path) in _in_use
+
+
+def _try_flock(path):
+    # Flock exclusivo sin esperar: el archivo abierto (que lo mantiene) o None si otro lo tiene
+    if fcntl is None:
+        return open(path, "a+b")
+    f = open(path, "a+b")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+class FolderStore:
+    """Páginas de una carpeta empaquetadas en un segmento comprimido de solo-añadir.
+
+    En ``<carpeta>/.store/``:
+
+    - ``segment-<gen>.dat``: cada documento comprimido con zlib, uno detrás de otro.
+    - ``index-<gen>.jsonl``: una línea por escritura (nombre, offset, longitud,
+      tamaño original, hash, mtime); la última línea de cada nombre manda.
+    - ``CURRENT``: generación activa. La compactación escribe una generación
+      nueva sin los documentos reemplazados o borrados y cambia el puntero.
+    - ``last_access``: su mtime es el último acceso, lo usa el recolector.
+
+    - ``LOCK``: flock de las escrituras, la compactación y los refrescos del
+      índice, para que varios workers de uvicorn compartan la carpeta.
+
+    Los archivos sueltos de carpetas antiguas se empaquetan al abrirla.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(folder_path, STORE_DIR)
+        self.lock = _folder_lock(folder_path)
+        self.generation = None
+        self.entries = {}
+        self.dead_bytes = 0
+        self._index_offset = 0
+        self._last_touch = 0.0
+        # mtime de la carpeta antes de crear .store (crearlo lo actualiza): último acceso
+        # de las carpetas antiguas, que aún no tienen last_access
+        try:
+            folder_mtime = os.stat(folder_path).st_mtime
+        except FileNotFoundError:
+            folder_mtime = time.time()
+        os.makedirs(self.path, exist_ok=True)
+        with self.lock:
+            self._refresh()
+            self._migrate_loose_files()
+            access_path = os.path.join(self.path, "last_access")
+            if not os.path.exists(access_path):
+                open(access_path, "a").close()
+                os.utime(access_path, (folder_mtime, folder_mtime))
+
+    # -- índice ---------------------------------------------------------------
+
+    def _current_generation(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT"), "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _segment_path(self, generation=None):
+        return os.path.join(self.path, f"segment-{self.generation if generation is None else generation}.dat")
+
+    def _index_path(self, generation=None):
+        return os.path.join(self.path, f"index-{self.generation if generation is None else generation}.jsonl")
+
+    def _refresh(self):
+        # Lee solo las líneas nuevas del índice (otro proceso pudo añadir documentos)
+        generation = self._current_generation()
+        if generation != self.generation:
+            self.generation = generation
+            self.entries = {}
+            self.dead_bytes = 0
+            self._index_offset = 0
+        try:
+            with open(self._index_path(), "rb") as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Línea a medio escribir: se leerá completa en el próximo refresco
+                        break
+                    self._index_offset += len(line)
+                    self._apply(json.loads(line))
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, entry):
+        previous = self.entries.pop(entry["name"], None)
+        if previous is not None:
+            self.dead_bytes += previous["length"]
+        if not entry.get("deleted"):
+            self.entries[entry["name"]] = entry
+
+    def signature(self):
+        # Cambia con cada escritura, borrado o compactación, sin leer documentos
+        with self.lock:
+            self._refresh()
+            return f"{self.generation}:{self._index_offset}"
+
+    # -- lectura --------------------------------------------------------------
+
+    def names(self, extensions=None):
+        with self.lock:
+            self._refresh()
+            names = sorted(self.entries)
+        self.touch()
+        return [name for name in names if extensions is None or name.endswith(extensions)]
+
+    def exists(self, name):
+        with self.lock:
+            self._refresh()
+            return name in self.entries
+
+    def stat(self, name):
+        # {"size", "mtime_ns", "sha256"} del documento, o None si no existe
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(name)
+        if entry is None:
+            return None
+        return {"size": entry["size"], "mtime_ns": entry["mtime_ns"], "sha256": entry["sha256"]}
+
+    def get(self, name):
+        # Lectura aleatoria: un seek y una descompresión
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(name)
+            if entry is None:
+                raise FileNotFoundError(os.path.join(self.folder_path, name))
+            with open(self._segment_path(), "rb") as f:
+                f.seek(entry["offset"])
+                data = f.read(entry["length"])
+        self.touch()
+        return zlib.decompress(data).decode("utf-8")
+
+    def iter_text(self, name, block_size=READ_BLOCK_SIZE):
+        # Lectura en streaming: descomprime por bloques sin cargar el documento entero
+        with self.lock:
+            self._refresh()
+            entry = self.entries.get(name)
+            if entry is None:
+                raise FileNotFoundError(os.path.join(self.folder_path, name))
+            f = open(self._segment_path(), "rb")
+        self.touch()
+        decompressor = zlib.decompressobj()
+        decoder = _utf8_decoder()
+        with f:
+            f.seek(entry["offset"])
+            remaining = entry["length"]
+            while remaining:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                text = decoder.decode(decompressor.decompress(block))
+                if text:
+                    yield text
+            tail = decoder.decode(decompressor.flush(), final=True)
+            if tail:
+                yield tail
+
+    # -- escritura ------------------------------------------------------------
+
+    def put(self, name, text, mtime_ns=None):
+        entry = self._put(name, text, mtime_ns)
+        self.touch()
+        return entry
+
+    def _put(self, name, text, mtime_ns=None):
+        raw = text.encode("utf-8")
+        data = zlib.compress(raw, 6)
+        # Con el flock tomado ningún otro proceso escribe entre el seek y el write
+        with self.lock:
+            self._refresh()
+            with open(self._segment_path(), "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(data)
+            entry = {"name": name, "offset": offset, "length": len(data), "size": len(raw),
+                     "sha256": hashlib.sha256(raw).hexdigest(), "mtime_ns": mtime_ns or time.time_ns()}
+            self._append_index(entry)
+        return entry
+
+    def delete(self, name):
+        with self.lock:
+            self._refresh()
+            if name in self.entries:
+                self._append_index({"name": name, "deleted": True})
+
+    def _append_index(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self._index_path(), "ab") as f:
+            f.write(line)
+        self._refresh()
+
+    def touch(self):
+        now = time.time()
+        if now - self._last_touch < ACCESS_TOUCH_INTERVAL:
+            return
+        self._last_touch = now
+        access_path = os.path.join(self.path, "last_access")
+        try:
+            os.utime(access_path)
+        except FileNotFoundError:
+            open(access_path, "a").close()
+
+    def last_access(self):
+        return os.stat(os.path.join(self.path, "last_access")).st_mtime
+
+    # -- mantenimiento --------------------------------------------------------
+
+    def _migrate_loose_files(self):
+        # Carpetas de antes del segmento: sus archivos pasan dentro (con su mtime) y se borran.
+        # Sin touch(): empaquetar no es un acceso
+        loose = [name for name in os.listdir(self.folder_path)
+                 if name.endswith(PACKED_EXTENSIONS) and os.path.isfile(os.path.join(self.folder_path, name))]
+        for name in sorted(loose):
+            path = os.path.join(self.folder_path, name)
+            # En binario: sin traducir saltos de línea, así el hash coincide con el del índice
+            with open(path, "rb") as f:
+                self._put(name, f.read().decode("utf-8"), mtime_ns=os.stat(path).st_mtime_ns)
+            os.remove(path)
+        if loose:
+            print(f"Carpeta {self.folder_path}: {len(loose)} archivos empaquetados en el segmento")
+
+    @property
+    def live_bytes(self):
+        return sum(entry["length"] for entry in self.entries.values())
+
+    def compact(self):
+        # Reescribe solo los documentos vivos en una generación nueva y descarta la anterior
+        with self.lock:
+            self._refresh()
+            if not self.dead_bytes:
+                return False
+            old_generation = self.generation
+            new_generation = old_generation + 1
+            entries = []
+            with open(self._segment_path(), "rb") as src, open(self._segment_path(new_generation), "wb") as dst:
+                for name in sorted(self.entries):
+                    entry = dict(self.entries[name])
+                    src.seek(entry["offset"])
+                    data = src.read(entry["length"])
+                    entry["offset"] = dst.tell()
+                    dst.write(data)
+                    entries.append(entry)
+            with open(self._index_path(new_generation), "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            tmp_current = os.path.join(self.path, f"CURRENT.tmp-{os.getpid()}")
+            with open(tmp_current, "w", encoding="utf-8") as f:
+                f.write(str(new_generation))
+            os.replace(tmp_current, os.path.join(self.path, "CURRENT"))
+            self._refresh()
+            # Quien ya tenga abierto el segmento viejo lo sigue leyendo hasta cerrarlo
+            for path in (self._segment_path(old_generation), self._index_path(old_generation)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return True
+
+    def stats(self):
+        with self.lock:
+            self._refresh()
+            return {"documents": len(self.entries), "generation": self.generation,
+                    "raw_bytes": sum(entry["size"] for entry in self.entries.values()),
+                    "stored_bytes": self.live_bytes, "dead_bytes": self.dead_bytes}
+
+
+def _utf8_decoder():
+    import codecs
+    return codecs.getincrementaldecoder("utf-8")()
+
+
+_stores = OrderedDict()
+_stores_guard = threading.Lock()
+STORE_CACHE_SIZE = int(os.getenv("STORE_CACHE_SIZE", "256"))
+
+
+def get_folder_store(folder_path):
+    # Instancias reutilizadas (su índice ya está en memoria) para las carpetas más usadas
+    key = os.path.abspath(folder_path)
+    with _stores_guard:
+        store = _stores.get(key)
+        if store is not None:
+            _stores.move_to_end(key)
+            return store
+    store = FolderStore(folder_path)
+    with _stores_guard:
+        store = _stores.setdefault(key, store)
+        while len(_stores) > STORE_CACHE_SIZE:
+            _stores.popitem(last=False)
+    return store
+
+
+def folder_signature(folder_path):
+    # Huella barata para saber si la carpeta cambió: la posición del índice del segmento
+    return get_folder_store(folder_path).signature()
+
+
+def forget_folder_store(folder_path):
+    with _stores_guard:
+        _stores.pop(os.path.abspath(folder_path), None)
+
+
+def folder_disk_bytes(folder_path):
+    total = 0
+    for root, _, files in os.walk(folder_path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class StoreCollector:
+    """Recolector en segundo plano de las carpetas de ``data/``.
+
+    Cada ``interval`` segundos: compacta los segmentos con mucho espacio muerto,
+    borra las carpetas sin acceso desde hace ``ttl`` segundos y, si el total
+    sigue por encima de ``max_bytes``, borra las menos usadas recientemente.
+    Las carpetas en uso (``folder_in_use``: pipelines, trabajos, análisis y
+    rails, de cualquier proceso) no se compactan ni se borran; ``is_busy``
+    añade otras condiciones. Con varios workers solo recolecta uno: el que
+    tiene el flock de ``<root>/.collector.lock`` (si termina, lo toma otro).
+    """
+
+    def __init__(self, root="data", ttl=None, max_bytes=None, interval=None, on_evict=None, is_busy=None):
+        self.root = root
+        self.ttl = ttl or float(os.getenv("STORE_TTL_DAYS", "7")) * 86400
+        self.max_bytes = max_bytes or int(os.getenv("STORE_DISK_BUDGET_MB", "10240")) * 1024 * 1024
+        self.interval = interval or float(os.getenv("STORE_GC_INTERVAL", "600"))
+        self.on_evict = on_evict
+        self.is_busy = is_busy or (lambda folder_path: False)
+        self.evicted = 0
+        self.skipped_busy = 0
+        self.compacted = 0
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader_lock = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="store-collector", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._leader_lock is not None:
+            self._leader_lock.close()
+            self._leader_lock = None
+
+    def is_leader(self):
+        # Se intenta en cada vuelta: si el proceso líder termina, su flock se libera
+        if self._leader_lock is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._leader_lock = _try_flock(os.path.join(self.root, ".collector.lock"))
+        return self._leader_lock is not None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.is_leader():
+                    self.collect()
+            except Exception as e:
+                print(f"Error en el recolector de carpetas: {e}")
+
+    def _busy(self, folder_path):
+        return folder_is_busy(folder_path) or self.is_busy(folder_path)
+
+    def collect(self):
+        if not os.path.isdir(self.root):
+            return
+        now = time.time()
+        folders = []
+        for name in os.listdir(self.root):
+            folder_path = os.path.join(self.root, name)
+            if not os.path.isdir(folder_path) or self._busy(folder_path):
+                continue
+            store = get_folder_store(folder_path)
+            # Compactar cuando más de la mitad del segmento son versiones viejas
+            if store.dead_bytes and store.dead_bytes > store.live_bytes:
+                if store.compact():
+                    self.compacted += 1
+            folders.append((store.last_access(), folder_path, folder_disk_bytes(folder_path)))
+
+        folders.sort()
+        total = sum(size for _, _, size in folders)
+        for last_access, folder_path, size in folders:
+            if now - last_access < self.ttl and total <= self.max_bytes:
+                break
+            if self._evict(folder_path):
+                total -= size
+        self.last_run = now
+
+    def _evict(self, folder_path):
+        if self._busy(folder_path):
+            self.skipped_busy += 1
+            return False
+        with _folder_lock(folder_path):
+            # En uso en otro proceso: su flock compartido impide tomar IN_USE en exclusiva
+            marker = _try_flock(os.path.join(folder_path, STORE_DIR, "IN_USE"))
+            if marker is None:
+                self.skipped_busy += 1
+                return False
+            with marker:
+                # Pudo empezar a usarse en este proceso entre la comprobación y el flock
+                if folder_is_busy(folder_path):
+                    self.skipped_busy += 1
+                    return False
+                shutil.rmtree(folder_path, ignore_errors=True)
+        forget_folder_store(folder_path)
+        self.evicted += 1
+        print(f"Carpeta {folder_path} eliminada por el recolector")
+        if self.on_evict is not None:
+            self.on_evict(folder_path)
+        return True
+
+    def stats(self):
+        return {"ttl_seconds": self.ttl, "max_bytes": self.max_bytes, "evicted": self.evicted,
+                "compacted": self.compacted, "skipped_busy": self.skipped_busy,
+                "leader": self._leader_lock is not None, "last_run": self.last_run}
@@ -0,0 +1,102 @@
+import os
+import re
+import hashlib
+
+# Separa los fragmentos ya troceados dentro de un archivo de la carpeta; el indexador
+# usa cada fragmento como un nodo sin volver a partirlo
+CHUNK_SEPARATOR = "\f"
+
+# Párrafos típicos de navegación, cookies o pies de página que no aportan al análisis
+BOILERPLATE = re.compile(
+    r"(cookie|privacy policy|política de privacidad|terms of (use|service)|términos y condiciones|"
+    r"all rights reserved|todos los derechos reservados|©|subscribe to our newsletter|suscríbete|"
+    r"sign in|log in|iniciar sesión|regístrate|skip to (main )?content|javascript (is )?(disabled|required)|"
+    r"share (this|on)|compartir en|follow us|síguenos)",
+    re.IGNORECASE,
+)
+HEADING_TAGS = ("h1", "h2")
+
+
+class TextChunker:
+    """Agrupa párrafos en fragmentos a medida que llegan, sin guardar el documento entero.
+
+    Descarta párrafos repetidos (por hash) y los de relleno (menús, avisos de
+    cookies, copyright). Corta un fragmento al llegar a ``max_chars`` o al
+    empezar un título, y deja de aceptar texto al llegar a ``max_total_chars``:
+    la memoria por página queda acotada aunque el HTML sea enorme.
+    """
+
+    def __init__(self, max_chars=None, max_total_chars=None, min_words=None):
+        self.max_chars = max_chars or int(os.getenv("SCRAPER_CHUNK_CHARS", "2000"))
+        self.max_total_chars = max_total_chars or int(os.getenv("SCRAPER_MAX_TEXT_CHARS", str(2 * 1024 * 1024)))
+        self.min_words = min_words or int(os.getenv("SCRAPER_MIN_PARAGRAPH_WORDS", "4"))
+        self.chunks = []
+        self.total_chars = 0
+        self.duplicates = 0
+        self.boilerplate = 0
+        self.truncated = False
+        self._current = []
+        self._current_chars = 0
+        self._current_body = False
+        self._seen = set()
+
+    def add(self, tag, text):
+        # Devuelve False cuando ya no se acepta más texto (el llamador puede dejar de leer)
+        if self.truncated:
+            return False
+        text = re.sub(r"\s+", " ", text or "").strip()
+        if not text:
+            return True
+        heading = tag in HEADING_TAGS
+        if not heading and (len(text.split()) < self.min_words or
+                            (len(text) < 200 and BOILERPLATE.search(text))):
+            self.boilerplate += 1
+            return True
+        digest = hashlib.blake2b(text.lower().encode("utf-8"), digest_size=8).digest()
+        if digest in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen.add(digest)
+
+        if self.total_chars + len(text) > self.max_total_chars:
+            self.truncated = True
+            return False
+        # Un título abre fragmento nuevo salvo que el actual solo tenga títulos
+        if self._current and ((heading and self._current_body) or
+                              self._current_chars + len(text) > self.max_chars):
+            self._flush()
+        self._current.append(text)
+        self._current_chars += len(text) + 1
+        self._current_body = self._current_body or not heading
+        self.total_chars += len(text)
+        return True
+
+    def _flush(self):
+        self.chunks.append("\n".join(self._current))
+        self._current = []
+        self._current_chars = 0
+        self._current_body = False
+
+    def close(self):
+        if self._current:
+            self._flush()
+        return self
+
+    @property
+    def text_length(self):
+        return self.total_chars
+
+    def text(self):
+        self.close()
+        return f"\n{CHUNK_SEPARATOR}\n".join(self.chunks)
+
+    def stats(self):
+        return {"chunks": len(self.chunks) + bool(self._current), "chars": self.total_chars,
+                "duplicates": self.duplicates, "boilerplate": self.boilerplate, "truncated": self.truncated}
+
+
+def split_chunks(text):
+    # Fragmentos de un archivo escrito con CHUNK_SEPARATOR, o None si no viene troceado
+    if CHUNK_SEPARATOR not in text:
+        return None
+    return [chunk.strip() for chunk in text.split(CHUNK_SEPARATOR) if chunk.strip()]
@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+from html.parser import HTMLParser
+import httpx
+
+# Mismas etiquetas que usa BeautifulSoupTransformer en ScraperSimple
+TAGS_TO_EXTRACT = ("p", "h1", "h2")
+SKIP_TAGS = ("script", "style", "noscript", "template")
+# Etiquetas de bloque que cierran implícitamente un <p> sin cerrar
+BLOCK_TAGS = ("div", "section", "article", "ul", "ol", "table", "form", "header", "footer",
+              "h1", "h2", "h3", "h4", "h5", "h6", "p")
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+class TagTextExtractor(HTMLParser):
+    """Extrae el texto de p/h1/h2 a medida que llega el HTML, sin construir un árbol.
+
+    Con ``sink`` (p. ej. un TextChunker) cada párrafo se le entrega en cuanto se
+    cierra y no se acumula aquí; si el sink devuelve False se deja de extraer.
+    """
+
+    def __init__(self, tags=TAGS_TO_EXTRACT, sink=None):
+        super().__init__(convert_charrefs=True)
+        self.tags = tags
+        self.sink = sink
+        self.paragraphs = []
+        self.done = False
+        self._current = None
+        self._current_tag = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS and self._current is not None:
+            self._flush()
+        if tag in self.tags:
+            self._current = []
+            self._current_tag = tag
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == self._current_tag:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._current is not None and not self._skip_depth and not self.done:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        if self._current is not None:
+            self._flush()
+
+    def _flush(self):
+        text = re.sub(r"\s+", " ", "".join(self._current)).strip()
+        if text and self.sink is not None:
+            self.done = not self.sink.add(self._current_tag, text)
+        elif text:
+            self.paragraphs.append(text)
+        self._current = None
+        self._current_tag = None
+
+    @property
+    def text_length(self):
+        if self.sink is not None:
+            return self.sink.text_length
+        return sum(len(p) for p in self.paragraphs)
+
+    def text(self):
+        if self.sink is not None:
+            return self.sink.text()
+        return "\n".join(self.paragraphs)
+
+
+class HttpFetcher:
+    """Cliente HTTP asíncrono con keep-alive compartido por todo el proceso."""
+
+    def __init__(self, timeout=None, max_bytes=None):
+        self.timeout = timeout or float(os.getenv("SCRAPER_HTTP_TIMEOUT", "15"))
+        self.max_bytes = max_bytes or int(os.getenv("SCRAPER_HTTP_MAX_BYTES", str(5 * 1024 * 1024)))
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def extract(self, url, extractor, etag=None, last_modified=None):
+        # Alimenta el extractor con el HTML a medida que se descarga. Con etag o
+        # last_modified hace un GET condicional: si devuelve 304 no hay cuerpo que leer
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        async with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return response
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if "html" not in content_type:
+                raise ValueError(f"Unsupported content type: {content_type or 'unknown'}")
+            received = 0
+            async for chunk in response.aiter_text():
+                extractor.feed(chunk)
+                received += len(chunk)
+                if received >= self.max_bytes or extractor.done:
+                    break
+        extractor.close()
+        return response
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class TierStats:
+    # Cuántas URLs sirvió cada nivel y cuánto tardó, para medir el ahorro de navegador
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiers = {}
+        self.escalations = 0
+        self.escalation_seconds = 0.0
+
+    def record(self, tier, seconds):
+        with self._lock:
+            stats = self.tiers.setdefault(tier, {"count": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+
+    def record_escalation(self, seconds):
+        with self._lock:
+            self.escalations += 1
+            self.escalation_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            tiers = {tier: dict(stats) for tier, stats in self.tiers.items()}
+            escalations = self.escalations
+            escalation_seconds = self.escalation_seconds
+        http = tiers.get("http", {"count": 0, "seconds": 0.0})
+        browser = tiers.get("browser", {"count": 0, "seconds": 0.0})
+        avg_browser = browser["seconds"] / browser["count"] if browser["count"] else None
+        return {
+            "tiers": tiers,
+            "escalations": escalations,
+            "escalation_seconds": round(escalation_seconds, 3),
+            # Tiempo de navegador evitado: páginas servidas por HTTP a coste medio de Chromium
+            "estimated_browser_seconds_saved": (
+                round(http["count"] * avg_browser - http["seconds"], 3) if avg_browser is not None else None
+            ),
+        }
+
+
+_http_fetcher = None
+tier_stats = TierStats()
+
+
+def get_http_fetcher():
+    global _http_fetcher
+    if _http_fetcher is None:
+        _http_fetcher = HttpFetcher()
+    return _http_fetcher
@@ -1,42 +1,18 @@
 from crewai_tools import BaseTool
-from langchain_community.tools import DuckDuckGoSearchResults
-import re
+from search_adapter import get_search, SEARCH_MAX_RESULTS
 import os
 
-class DuckDuckGoTool2(BaseTool):
-    name: str = "Web Search Tool"
-    description: str = "Herramienta para buscar en la web y obtener resultados relevantes."
-
-    def _run(self, query: str) -> list:
-        results = DuckDuckGoSearchResults(max_results=5).run(query)
-        snippets = re.findall(r'snippet: (.*?), title:', results)
-        titles = re.findall(r'title: (.*?), link:', results)
-        links = re.findall(r'link: (https?://[^\s,]+)', results)
-        
-        processed_results = [{'title': title, 'snippet': snippet, 'link': link}
-                             for title, snippet, link in zip(titles, snippets, links)]
-        return processed_results
-
-
-
 class DuckDuckGoTool(BaseTool):
     name: str = "Web Search Tool"
     description: str = "Tool to search the web and retrieve relevant results."
 
-    def _run(self, query: str) -> list:
-        results = DuckDuckGoSearchResults(max_results=5).run(query)
-        
-        # Extract data from search results
-        snippets = re.findall(r'snippet: (.*?), title:', results)
-        titles = re.findall(r'title: (.*?), link:', results)
-        links = re.findall(r'link: (https?://[^\s,]+)', results)
-        
-        processed_results = [{'title': title, 'snippet': snippet, 'link': link}
-                             for title, snippet, link in zip(titles, snippets, links)]
-        
-        print("---my super result is: _", processed_results)
-        print("____________")
-        return processed_results  # Just return results without saving
+    def _run(self, query: str, max_results: int = SEARCH_MAX_RESULTS, page: int = 0) -> list:
+        # Resultados estructurados del adaptador, sin parsear texto ni reparar JSON
+        return [result.to_dict() for result in get_search().search(query, max_results, page)]
+
+
+class DuckDuckGoTool2(DuckDuckGoTool):
+    description: str = "Herramienta para buscar en la web y obtener resultados relevantes."
 
 
 
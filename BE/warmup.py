@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+import inspect
+from metrics import span
+
+
+class Warmup:
+    """Subsistemas pesados (crewai, Chromium, LlamaIndex, Guardrails) cargados bajo demanda.
+
+    Cada componente se registra con su función de carga y se carga una sola vez,
+    la primera vez que un endpoint lo pide (``await components.get(nombre)``);
+    las peticiones que llegan mientras carga esperan a la misma carga. Con
+    ``WARMUP=a,b`` se precargan en segundo plano al arrancar, y ``/ready``
+    responde 503 hasta que todos están cargados (si alguno falló, sigue en 503
+    y el cuerpo indica el error).
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._futures = {}
+        self._status = {}
+        self.requested = []
+
+    def register(self, name, loader):
+        # loader: función síncrona (se ejecuta en un hilo) o corrutina; su resultado se guarda
+        self._loaders[name] = loader
+        self._status[name] = {"state": "cold"}
+
+    async def get(self, name):
+        future = self._futures.get(name)
+        if future is None:
+            future = self._futures[name] = asyncio.ensure_future(self._load(name))
+        # shield: si el cliente se desconecta no se cancela la carga para los demás
+        return await asyncio.shield(future)
+
+    async def _load(self, name):
+        loader = self._loaders[name]
+        self._status[name] = {"state": "loading"}
+        start = time.perf_counter()
+        try:
+            with span("warmup", component=name):
+                if inspect.iscoroutinefunction(loader):
+                    result = await loader()
+                else:
+                    result = await asyncio.to_thread(loader)
+        except BaseException as e:
+            # El siguiente get() lo vuelve a intentar
+            self._futures.pop(name, None)
+            self._status[name] = {"state": "error", "error": f"{type(e).__name__}: {e}",
+                                  "seconds": round(time.perf_counter() - start, 3)}
+            raise
+        self._status[name] = {"state": "ready", "seconds": round(time.perf_counter() - start, 3)}
+        return result
+
+    def is_loaded(self, name):
+        return self._status.get(name, {}).get("state") == "ready"
+
+    async def warm(self, names):
+        # Uno detrás de otro: así el arranque no compite por CPU con las primeras peticiones
+        for name in names:
+            try:
+                await self.get(name)
+            except Exception as e:
+                print(f"Precarga de {name} fallida: {type(e).__name__}: {e}")
+
+    def status(self):
+        # Listo solo si cargó todo lo pedido: una precarga fallida deja la réplica fuera del
+        # balanceador (503) hasta que una petición posterior consiga cargar el componente
+        ready = all(self._status[name]["state"] == "ready" for name in self.requested)
+        failed = {name: self._status[name]["error"] for name in self.requested
+                  if self._status[name]["state"] == "error"}
+        return {"ready": ready, "warmup": self.requested, "failed": failed, "components": dict(self._status)}
+
+    def install(self, app):
+        """Precarga de WARMUP al arrancar la app y endpoint ``/ready``."""
+        from fastapi.responses import JSONResponse
+
+        requested = [name.strip() for name in os.getenv("WARMUP", "").split(",") if name.strip()]
+        if "all" in requested:
+            requested = list(self._loaders)
+        # api y guardials comparten .env: cada app ignora los componentes de la otra
+        self.requested = [name for name in requested if name in self._loaders]
+
+        @app.on_event("startup")
+        async def start_warmup():
+            if self.requested:
+                # Sin esperar: el servidor acepta peticiones mientras tanto
+                self._task = asyncio.ensure_future(self.warm(self.requested))
+
+        @app.get("/ready")
+        async def ready():
+            status = self.status()
+            return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+components = Warmup()